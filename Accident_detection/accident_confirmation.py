@@ -0,0 +1,106 @@
+import itertools
+import os
+from collections import deque
+
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU between two arrays of xyxy boxes, shape (len(a), len(b))"""
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+class Track:
+    def __init__(self, track_id, box, confidence, history):
+        self.id = track_id
+        self.box = box
+        self.confidences = deque([confidence], maxlen=history)
+        self.hits = 1
+        self.misses = 0
+        self.confirmed = False
+
+    @property
+    def mean_confidence(self):
+        return float(np.mean(self.confidences))
+
+
+class AccidentConfirmer:
+    """Turns per-frame detections into one confirmed accident event per tracked object.
+
+    Boxes are associated with existing tracks greedily by IoU. A track is confirmed after
+    it has been matched in `min_hits` frames with a mean confidence of at least
+    `min_confidence` (0 by default, so the model's own detection threshold is the only
+    gate); up to `max_misses` missed frames in a row neither reset nor end it,
+    so a flickering detection still confirms once and doesn't fire again. `update()`
+    returns the tracks confirmed on that frame, and `accident_state` stays on while any
+    confirmed track is alive.
+    """
+
+    def __init__(self, iou_threshold=0.3, min_hits=5, max_misses=10, min_confidence=0.0, history=30):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.min_confidence = min_confidence
+        self.history = history
+        self.tracks = []
+        self.track_ids = itertools.count(1)
+
+    @property
+    def accident_state(self):
+        return any(track.confirmed for track in self.tracks)
+
+    def update_from_result(self, result):
+        boxes = result.boxes.cpu().numpy()
+        return self.update(boxes.xyxy, boxes.conf)
+
+    def update(self, boxes, confidences):
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+
+        matched_tracks = set()
+        matched_boxes = set()
+        if self.tracks and len(boxes):
+            ious = box_iou(np.array([track.box for track in self.tracks]), boxes)
+            # Greedy assignment, best overlaps first
+            for t, b in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+                if ious[t, b] < self.iou_threshold:
+                    break
+                if t in matched_tracks or b in matched_boxes:
+                    continue
+                track = self.tracks[t]
+                track.box = boxes[b]
+                track.confidences.append(float(confidences[b]))
+                track.hits += 1
+                track.misses = 0
+                matched_tracks.add(t)
+                matched_boxes.add(b)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+
+        for b in range(len(boxes)):
+            if b not in matched_boxes:
+                self.tracks.append(Track(next(self.track_ids), boxes[b], float(confidences[b]), self.history))
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        confirmed = []
+        for track in self.tracks:
+            if (not track.confirmed and track.misses == 0 and track.hits >= self.min_hits
+                    and track.mean_confidence >= self.min_confidence):
+                track.confirmed = True
+                confirmed.append(track)
+        return confirmed
+
+
+def confirmer_from_env():
+    """AccidentConfirmer for the entry points; NETRA_MIN_CONFIDENCE adds a mean-confidence gate"""
+    return AccidentConfirmer(min_confidence=float(os.environ.get("NETRA_MIN_CONFIDENCE", 0.0)))
@@ -0,0 +1,35 @@
+import json
+import threading
+
+
+class ChangeNotifier:
+    """Wakes up streaming clients as soon as this process adds or changes an alert.
+
+    Clients still re-check the store when `wait()` times out, which is how they pick up
+    changes written by other server processes.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.changes = 0
+
+    def notify(self):
+        with self.condition:
+            self.changes += 1
+            self.condition.notify_all()
+
+    def wait(self, seen, timeout):
+        """Block until a change newer than `seen` or the timeout; returns the latest change count"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.changes != seen, timeout)
+            return self.changes
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,224 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Outcomes of one post, after retries
+SENT, REJECTED, SERVER_ERROR, DOWN = "sent", "rejected", "server_error", "down"
+
+
+class AlertOutbox:
+    """Delivers accident alerts from a background thread so detection never waits on the network.
+
+    `submit()` only copies the frame and queues the alert. The worker saves the image to
+    `frame_store` (adding its image_path and thumbnail_path to the alert), posts the alert
+    through a pooled HTTP session with timeouts and retries with exponential backoff.
+    Alerts that still can't be delivered are spooled to disk (at most `max_spooled`, oldest
+    dropped first) and re-sent once the server is back, `batch_size` per request to
+    `batch_url` when one is given. A spooled batch the server refuses is split to find the
+    alerts at fault; those are set aside as `.bad` files (a server error only after
+    `max_spool_failures` flushes) so they don't hold back the rest of the spool.
+    """
+
+    def __init__(self, alert_url, spool_dir="alert_spool", timeout=(3, 5), retries=3,
+                 backoff=0.5, retry_interval=10.0, max_queue=100, max_spooled=500, frame_store=None,
+                 batch_url=None, batch_size=100, max_spool_failures=3):
+        self.alert_url = alert_url
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.frame_store = frame_store
+        self.spool_dir = spool_dir
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_interval = retry_interval
+        self.max_spooled = max_spooled
+        self.max_spool_failures = max_spool_failures
+        self.spool_failures = {}  # Spool file -> flushes in a row that got a server error for it alone
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stop_event = threading.Event()
+        self.last_spool_attempt = 0.0
+        # submit() spools from the detector thread when the queue is full, so spool file
+        # changes are serialized; never held across a network call
+        self.spool_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="alert-outbox", daemon=True)
+        self.thread.start()
+
+    def submit(self, payload, frame=None):
+        # Copy the frame: the caller's buffer is reused for the next video frame
+        item = (payload, None if frame is None else frame.copy())
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            print("⚠️ Alert outbox full, spooling alert without waiting for the worker")
+            self._spool(payload)
+            return False
+
+    def close(self, timeout=10.0):
+        """Stop the worker after it has handled everything already queued"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.stop_event.set()
+        self.session.close()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.retry_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            # One bad alert or spool file must not kill the worker and strand the queue
+            try:
+                self._handle(item)
+            except Exception as e:
+                print(f"❌ Alert outbox error: {e}")
+
+    def _handle(self, item):
+        if not item:
+            self._flush_spool()
+            return
+
+        payload, frame = item
+        if frame is not None and self.frame_store is not None:
+            try:
+                payload.update(self.frame_store.save(frame))
+            except Exception as e:
+                print(f"❌ Error saving alert frame: {e}")
+
+        outcome = self._post(payload)
+        if outcome == SENT:
+            self._flush_spool()
+        elif outcome == REJECTED:
+            print(f"⚠️ Alert from {payload.get('address')} rejected by the server, not retrying")
+        else:
+            self._spool(payload)
+
+    def _post(self, payload, url=None):
+        outcome = DOWN
+        for attempt in range(self.retries):
+            try:
+                response = self.session.post(url or self.alert_url, json=payload, timeout=self.timeout)
+                if response.status_code == 200:
+                    if isinstance(payload, list):
+                        print(f"✅ {len(payload)} spooled alerts sent successfully!")
+                    else:
+                        print(f"✅ Alert sent successfully from {payload.get('address')}!")
+                    return SENT
+                if response.status_code < 500:
+                    # The server rejected this alert; retrying won't change that
+                    print(f"⚠️ Failed to send alert. Status code: {response.status_code}")
+                    return REJECTED
+                print(f"⚠️ Alert server error. Status code: {response.status_code}")
+                # A gateway or overloaded server says nothing about this alert; a 500 might
+                outcome = DOWN if response.status_code in (502, 503, 504) else SERVER_ERROR
+            except requests.RequestException as e:
+                print(f"❌ Error sending alert: {str(e)}")
+                outcome = DOWN
+
+            if attempt + 1 < self.retries and self.stop_event.wait(self.backoff * 2 ** attempt):
+                break  # Shutting down
+        return outcome
+
+    def _spool_files(self):
+        return sorted(f for f in os.listdir(self.spool_dir) if f.endswith(".json"))
+
+    def _remove_spooled(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _spool(self, payload):
+        with self.spool_lock:
+            files = self._spool_files()
+            dropped = files[:max(0, len(files) - self.max_spooled + 1)]
+            for name in dropped:
+                self._remove_spooled(os.path.join(self.spool_dir, name))
+                self.spool_failures.pop(os.path.join(self.spool_dir, name), None)
+                print(f"⚠️ Alert spool full, dropped {name}")
+
+            path = os.path.join(self.spool_dir, f"{time.time_ns()}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(payload, f)
+            os.replace(path + ".tmp", path)
+        print(f"💾 Alert spooled for later delivery ({len(files) - len(dropped) + 1} pending)")
+
+    def _load_spooled(self, path):
+        """Payload of a spool file, or None if it was dropped meanwhile or can't be read"""
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"❌ Unreadable spooled alert {os.path.basename(path)}: {e}")
+            self._quarantine(path)
+            return None
+
+    def _quarantine(self, path):
+        # Keep it out of the retry loop but on disk for a look
+        self.spool_failures.pop(path, None)
+        with self.spool_lock:
+            try:
+                os.replace(path, path + ".bad")
+            except OSError:
+                pass
+
+    def _flush_spool(self):
+        now = time.monotonic()
+        if now - self.last_spool_attempt < self.retry_interval:
+            return
+        self.last_spool_attempt = now
+
+        with self.spool_lock:
+            files = self._spool_files()
+        chunk_size = self.batch_size if self.batch_url else 1
+        for start in range(0, len(files), chunk_size):
+            paths, payloads = [], []
+            for name in files[start:start + chunk_size]:
+                path = os.path.join(self.spool_dir, name)
+                payload = self._load_spooled(path)
+                if payload is not None:
+                    paths.append(path)
+                    payloads.append(payload)
+            if payloads and not self._send_spooled(paths, payloads):
+                return  # Still down, try again later
+
+    def _send_spooled(self, paths, payloads):
+        """Post spooled alerts; returns False when the server is unreachable"""
+        outcome = self._post(payloads, self.batch_url) if self.batch_url else self._post(payloads[0])
+        if outcome == SENT:
+            with self.spool_lock:
+                for path in paths:
+                    self.spool_failures.pop(path, None)
+                    self._remove_spooled(path)
+            return True
+        if outcome == DOWN:
+            return False
+
+        if len(paths) > 1:
+            # Refused or crashed on something in this batch: halve it until the culprits are alone
+            middle = len(paths) // 2
+            return (self._send_spooled(paths[:middle], payloads[:middle])
+                    and self._send_spooled(paths[middle:], payloads[middle:]))
+
+        path = paths[0]
+        failures = self.spool_failures.get(path, 0) + 1
+        self.spool_failures[path] = failures
+        if outcome == REJECTED or failures >= self.max_spool_failures:
+            print(f"⚠️ Server keeps refusing spooled alert {os.path.basename(path)}, setting it aside")
+            self._quarantine(path)
+        return True
@@ -0,0 +1,459 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from geo import bbox_around, haversine_km
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    latitude REAL,
+    longitude REAL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    image_path TEXT,
+    address TEXT,
+    acknowledged INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts (status, timestamp DESC);
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    latitude REAL,
+    longitude REAL,
+    address TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    alert_count INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_last_seen ON incidents (last_seen DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents (status, last_seen DESC);
+CREATE TABLE IF NOT EXISTS alert_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Columns added after the first schema, applied to existing databases on startup
+MIGRATIONS = [
+    ("version", "ALTER TABLE alerts ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+     "UPDATE alerts SET version = id"),
+    ("created_version", "ALTER TABLE alerts ADD COLUMN created_version INTEGER NOT NULL DEFAULT 0",
+     "UPDATE alerts SET created_version = version"),
+    ("thumbnail_path", "ALTER TABLE alerts ADD COLUMN thumbnail_path TEXT"),
+    ("incident_id", "ALTER TABLE alerts ADD COLUMN incident_id INTEGER REFERENCES incidents (id)"),
+]
+
+# R*Trees over alert and incident locations; points are stored as zero-size boxes
+RTREE_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS alerts_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+CREATE TRIGGER IF NOT EXISTS alerts_rtree_insert AFTER INSERT ON alerts
+WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN
+    INSERT INTO alerts_rtree VALUES (NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude);
+END;
+CREATE TRIGGER IF NOT EXISTS alerts_rtree_delete AFTER DELETE ON alerts BEGIN
+    DELETE FROM alerts_rtree WHERE id = OLD.id;
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS incidents_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+CREATE TRIGGER IF NOT EXISTS incidents_rtree_insert AFTER INSERT ON incidents
+WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN
+    INSERT INTO incidents_rtree VALUES (NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude);
+END;
+CREATE TRIGGER IF NOT EXISTS incidents_rtree_delete AFTER DELETE ON incidents BEGIN
+    DELETE FROM incidents_rtree WHERE id = OLD.id;
+END;
+"""
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+ALERT_COLUMNS = ("latitude", "longitude", "timestamp", "status", "image_path", "thumbnail_path",
+                 "address", "acknowledged")
+
+
+class AlertStore:
+    """SQLite storage for accident alerts, shared by all of the alert server's request threads.
+
+    The database runs in WAL mode so dashboard reads don't block detector writes. Ids come
+    from AUTOINCREMENT inside the insert, so concurrent requests never hand out the same id,
+    and timestamp/status are indexed for the dashboard's newest-first and by-status queries.
+
+    Every insert or status change stamps the alert with the next value of a global change
+    counter (`version`), so clients can ask for everything that changed since they last looked.
+
+    Locations are indexed in an SQLite R*Tree (`alerts_rtree`, kept in sync by triggers) for
+    bounding-box and radius queries. SQLite builds without the R*Tree module fall back to
+    scanning the latitude/longitude columns.
+
+    Each new alert joins the nearest incident within `merge_radius_km` whose first/last
+    sighting is within `merge_window` seconds of it, or starts a new incident. Candidates
+    come from the incidents R*Tree and last_seen index inside the insert transaction, so
+    concurrent detectors reporting the same crash end up in one incident.
+    """
+
+    def __init__(self, path="alerts.db", merge_radius_km=0.15, merge_window=300):
+        self.path = path
+        self.merge_radius_km = merge_radius_km
+        self.merge_window = timedelta(seconds=merge_window)
+        self.local = threading.local()
+        self.has_rtree = True
+        # Set up on a connection of its own and close it, so a server that imports the app
+        # before forking workers doesn't hand them a shared SQLite connection
+        conn = self.open()
+        try:
+            with conn:
+                conn.executescript(SCHEMA)
+                self.migrate(conn)
+                try:
+                    conn.executescript(RTREE_SCHEMA)
+                except sqlite3.OperationalError as e:
+                    print(f"⚠️ SQLite R*Tree unavailable ({e}), geo queries will scan all alerts")
+                    self.has_rtree = False
+                else:
+                    # Index alerts stored before the R*Tree existed
+                    conn.execute(
+                        "INSERT INTO alerts_rtree SELECT id, longitude, longitude, latitude, latitude FROM alerts "
+                        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL "
+                        "AND id NOT IN (SELECT id FROM alerts_rtree)"
+                    )
+            with conn:
+                # Group alerts stored before incidents existed, oldest first
+                for row in conn.execute("SELECT * FROM alerts WHERE incident_id IS NULL ORDER BY timestamp, id").fetchall():
+                    conn.execute(
+                        "UPDATE alerts SET incident_id = ? WHERE id = ?",
+                        (self.merge_into_incident(conn, dict(row), row["version"]), row["id"]),
+                    )
+        finally:
+            conn.close()
+
+    def migrate(self, conn):
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(alerts)")}
+        for column, *statements in MIGRATIONS:
+            if column not in columns:
+                for statement in statements:
+                    conn.execute(statement)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_version ON alerts (version)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_incident ON alerts (incident_id)")
+        conn.execute(
+            "INSERT OR IGNORE INTO alert_meta (key, value) "
+            "SELECT 'version', COALESCE(MAX(version), 0) FROM alerts"
+        )
+
+    def open(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def connection(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self.open()
+        return conn
+
+    @staticmethod
+    def to_dict(row):
+        alert = dict(row)
+        alert["acknowledged"] = bool(alert["acknowledged"])
+        return alert
+
+    @staticmethod
+    def next_version(conn):
+        # Runs inside the caller's write transaction, so versions are unique and ordered
+        conn.execute("UPDATE alert_meta SET value = value + 1 WHERE key = 'version'")
+        return conn.execute("SELECT value FROM alert_meta WHERE key = 'version'").fetchone()[0]
+
+    def current_version(self):
+        return self.connection().execute("SELECT value FROM alert_meta WHERE key = 'version'").fetchone()[0]
+
+    def insert(self, conn, alert):
+        values = [alert.get(column) for column in ALERT_COLUMNS]
+        values[ALERT_COLUMNS.index("acknowledged")] = int(bool(alert.get("acknowledged")))
+        version = self.next_version(conn)
+        incident_id = self.merge_into_incident(conn, alert, version)
+        cursor = conn.execute(
+            f"INSERT INTO alerts ({', '.join(ALERT_COLUMNS)}, version, created_version, incident_id) "
+            f"VALUES ({', '.join('?' * len(ALERT_COLUMNS))}, ?, ?, ?)",
+            values + [version, version, incident_id],
+        )
+        return cursor.lastrowid
+
+    def merge_into_incident(self, conn, alert, version):
+        """Id of the incident this alert belongs to, creating one if no open incident is close enough"""
+        lat, lon, timestamp = alert.get("latitude"), alert.get("longitude"), alert.get("timestamp")
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            lat = lon = None  # Missing, or a bad value stored before alerts were validated
+        try:
+            seen_at = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        except (TypeError, ValueError):
+            seen_at = None  # Can't place it in time, so it can't be merged
+
+        if lat is not None and lon is not None and seen_at and self.merge_radius_km > 0:
+            where, params = [], []
+            self.bbox_filter(bbox_around(lat, lon, self.merge_radius_km), where, params, table="incidents")
+            # A resolved incident is closed; a new report nearby opens a fresh one operators will see
+            where.append("status != 'resolved' AND last_seen >= ? AND first_seen <= ?")
+            params.extend([
+                (seen_at - self.merge_window).strftime(TIMESTAMP_FORMAT),
+                (seen_at + self.merge_window).strftime(TIMESTAMP_FORMAT),
+            ])
+            candidates = conn.execute(
+                f"SELECT id, latitude, longitude FROM incidents WHERE {' AND '.join(where)}", params
+            )
+            best, best_distance = None, self.merge_radius_km
+            for row in candidates:
+                distance = haversine_km(lat, lon, row["latitude"], row["longitude"])
+                if distance <= best_distance:
+                    best, best_distance = row["id"], distance
+            if best is not None:
+                # The incident keeps its first alert's location so a chain of nearby
+                # alerts can't drag it down the road
+                conn.execute(
+                    "UPDATE incidents SET alert_count = alert_count + 1, first_seen = MIN(first_seen, ?), "
+                    "last_seen = MAX(last_seen, ?), version = ? WHERE id = ?",
+                    (timestamp, timestamp, version, best),
+                )
+                return best
+
+        cursor = conn.execute(
+            "INSERT INTO incidents (latitude, longitude, address, first_seen, last_seen, status, version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (lat, lon, alert.get("address"), timestamp, timestamp,
+             alert.get("status") or "accident_detected", version),
+        )
+        return cursor.lastrowid
+
+    def add(self, alert):
+        with self.connection() as conn:
+            return self.get(self.insert(conn, alert))
+
+    def add_many(self, alerts):
+        """Insert several alerts in one transaction; returns their ids in order"""
+        with self.connection() as conn:
+            return [self.insert(conn, alert) for alert in alerts]
+
+    def get(self, alert_id):
+        row = self.connection().execute("SELECT * FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+        return self.to_dict(row) if row else None
+
+    def query(self, status=None, start=None, end=None, bbox=None, after=None, limit=100):
+        """One page of alerts, newest first, matching the given filters.
+
+        `after` is the (timestamp, id) of the last alert on the previous page; paging on
+        that key instead of an offset keeps every page an index range scan.
+        `bbox` is (min_lon, min_lat, max_lon, max_lat).
+        """
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if start:
+            where.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            where.append("timestamp <= ?")
+            params.append(end)
+        if bbox:
+            self.bbox_filter(bbox, where, params)
+        if after:
+            where.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([after[0], after[0], after[1]])
+
+        sql = "SELECT * FROM alerts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        rows = self.connection().execute(sql, params + [limit])
+        return [self.to_dict(row) for row in rows]
+
+    def query_incidents(self, status=None, start=None, end=None, bbox=None, after=None, limit=100):
+        """One page of incidents, most recently seen first, each with its alerts' `frames`.
+
+        Filters work like `query()`, with the time window applied to last_seen and
+        `after` being the (last_seen, id) of the previous page's last incident.
+        """
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if start:
+            where.append("last_seen >= ?")
+            params.append(start)
+        if end:
+            where.append("last_seen <= ?")
+            params.append(end)
+        if bbox:
+            self.bbox_filter(bbox, where, params, table="incidents")
+        if after:
+            where.append("(last_seen < ? OR (last_seen = ? AND id < ?))")
+            params.extend([after[0], after[0], after[1]])
+
+        sql = "SELECT * FROM incidents"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY last_seen DESC, id DESC LIMIT ?"
+        incidents = [dict(row) for row in self.connection().execute(sql, params + [limit])]
+        self.attach_frames(incidents)
+        return incidents
+
+    def get_incident(self, incident_id):
+        """An incident with its `frames` and full `alerts` list, or None"""
+        row = self.connection().execute("SELECT * FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+        if row is None:
+            return None
+        incident = dict(row)
+        self.attach_frames([incident])
+        incident["alerts"] = [
+            self.to_dict(alert) for alert in self.connection().execute(
+                "SELECT * FROM alerts WHERE incident_id = ? ORDER BY timestamp, id", (incident_id,)
+            )
+        ]
+        return incident
+
+    def attach_frames(self, incidents):
+        frames = {incident["id"]: [] for incident in incidents}
+        if not frames:
+            return
+        rows = self.connection().execute(
+            "SELECT incident_id, id, timestamp, image_path, thumbnail_path FROM alerts "
+            f"WHERE incident_id IN ({', '.join('?' * len(frames))}) AND image_path IS NOT NULL "
+            "ORDER BY timestamp, id",
+            list(frames),
+        )
+        for row in rows:
+            frames[row["incident_id"]].append({
+                "alert_id": row["id"],
+                "timestamp": row["timestamp"],
+                "image_path": row["image_path"],
+                "thumbnail_path": row["thumbnail_path"],
+            })
+        for incident in incidents:
+            incident["frames"] = frames[incident["id"]]
+
+    def bbox_filter(self, bbox, where, params, table="alerts"):
+        if self.has_rtree:
+            # The R*Tree stores 32-bit floats rounded outwards, so it only narrows the
+            # candidates; the exact comparison below decides points on the edge
+            where.append(
+                f"id IN (SELECT id FROM {table}_rtree "
+                "WHERE max_lon >= ? AND min_lon <= ? AND max_lat >= ? AND min_lat <= ?)"
+            )
+            params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+        where.append("longitude BETWEEN ? AND ? AND latitude BETWEEN ? AND ?")
+        params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+
+    def nearby(self, lat, lon, radius_km, status=None, limit=100):
+        """Alerts within radius_km of a point, nearest first, each with its `distance_km`"""
+        where, params = [], []
+        self.bbox_filter(bbox_around(lat, lon, radius_km), where, params)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        rows = self.connection().execute(f"SELECT * FROM alerts WHERE {' AND '.join(where)}", params)
+
+        alerts = []
+        for row in rows:
+            distance = haversine_km(lat, lon, row["latitude"], row["longitude"])
+            if distance <= radius_km:
+                alert = self.to_dict(row)
+                alert["distance_km"] = round(distance, 4)
+                alerts.append(alert)
+        alerts.sort(key=lambda alert: alert["distance_km"])
+        return alerts[:limit]
+
+    def clusters(self, zoom, bbox=None, status=None):
+        """Alert counts per grid cell of 360 / 2**zoom degrees, for drawing the map at that zoom"""
+        cell = 360.0 / 2 ** zoom
+        where, params = ["latitude IS NOT NULL AND longitude IS NOT NULL"], []
+        if bbox:
+            self.bbox_filter(bbox, where, params)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        # Coordinates are shifted to be non-negative, so CAST truncation is floor()
+        rows = self.connection().execute(
+            "SELECT CAST((longitude + 180) / ? AS INTEGER) AS cell_x, "
+            "CAST((latitude + 90) / ? AS INTEGER) AS cell_y, COUNT(*) AS count, "
+            "AVG(latitude) AS latitude, AVG(longitude) AS longitude, MAX(timestamp) AS latest "
+            f"FROM alerts WHERE {' AND '.join(where)} GROUP BY cell_x, cell_y",
+            [cell, cell] + params,
+        )
+        return [
+            {
+                "count": row["count"],
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+                "latest": row["latest"],
+                "bbox": [
+                    row["cell_x"] * cell - 180, row["cell_y"] * cell - 90,
+                    (row["cell_x"] + 1) * cell - 180, (row["cell_y"] + 1) * cell - 90,
+                ],
+            }
+            for row in rows
+        ]
+
+    def changes_since(self, version, limit=100):
+        """Alerts created or changed after `version`, oldest change first"""
+        rows = self.connection().execute(
+            "SELECT * FROM alerts WHERE version > ? ORDER BY version LIMIT ?", (version, limit)
+        )
+        return [self.to_dict(row) for row in rows]
+
+    def count(self, table="alerts"):
+        return self.connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def update_status(self, alert_id, status):
+        """Set the status of one alert; its incident is resolved once all of its alerts are"""
+        with self.connection() as conn:
+            version = self.next_version(conn)
+            cursor = conn.execute(
+                "UPDATE alerts SET status = ?, version = ? WHERE id = ?", (status, version, alert_id)
+            )
+            if cursor.rowcount == 0:
+                conn.rollback()  # Don't burn a version on an unknown id
+                return False
+            row = conn.execute("SELECT incident_id FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+            if row[0] is not None:
+                self.sync_incident_status(conn, row[0], status)
+            return True
+
+    def sync_incident_status(self, conn, incident_id, alert_status):
+        """Close an incident when its last open alert is resolved, reopen it when one isn't"""
+        open_alerts = conn.execute(
+            "SELECT COUNT(*) FROM alerts WHERE incident_id = ? AND status != 'resolved'", (incident_id,)
+        ).fetchone()[0]
+        incident_status = conn.execute("SELECT status FROM incidents WHERE id = ?", (incident_id,)).fetchone()[0]
+        if open_alerts == 0 and incident_status != 'resolved':
+            new_status = 'resolved'
+        elif open_alerts > 0 and incident_status == 'resolved':
+            new_status = alert_status
+        else:
+            return
+        conn.execute(
+            "UPDATE incidents SET status = ?, version = ? WHERE id = ?",
+            (new_status, self.next_version(conn), incident_id),
+        )
+
+    def update_incident_status(self, incident_id, status):
+        """Set the status of an incident and of every alert in it"""
+        with self.connection() as conn:
+            version = self.next_version(conn)
+            cursor = conn.execute(
+                "UPDATE incidents SET status = ?, version = ? WHERE id = ?", (status, version, incident_id)
+            )
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            # One version per alert, so paging through changes_since() never splits a version
+            alert_ids = [row[0] for row in conn.execute("SELECT id FROM alerts WHERE incident_id = ?", (incident_id,))]
+            for alert_id in alert_ids:
+                conn.execute(
+                    "UPDATE alerts SET status = ?, version = ? WHERE id = ?",
+                    (status, self.next_version(conn), alert_id),
+                )
+            return True
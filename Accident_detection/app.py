@@ -1,46 +1,360 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from datetime import datetime, timedelta
 import random
 import os
+import json
+import base64
+import gzip
+import re
+import zlib
+from alert_store import AlertStore, TIMESTAMP_FORMAT
+from alert_events import ChangeNotifier, format_sse
 
 app = Flask(__name__)
-alerts = []  # In-memory storage of alerts
+# Persistent, indexed alert storage; alerts within 150 m and 5 minutes of each other form one incident
+store = AlertStore(
+    os.environ.get("NETRA_ALERT_DB", "alerts.db"),
+    merge_radius_km=float(os.environ.get("NETRA_MERGE_RADIUS_M", "150")) / 1000,
+    merge_window=float(os.environ.get("NETRA_MERGE_WINDOW_SECONDS", "300")),
+)
+
+notifier = ChangeNotifier()  # Wakes /api/alerts/stream clients on new alerts and status changes
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_POLL_SECONDS = 2  # Also catches changes made by other server processes
+STREAM_HEARTBEAT_SECONDS = 15
+MAX_BATCH_SIZE = 1000
+MAX_BATCH_BYTES = 16 * 1024 * 1024  # Body limit for /alerts/batch, before and after decompression
+GZIP_MIN_BYTES = 1024  # Smaller JSON bodies aren't worth compressing
+
+# Frames named by their content hash (see frame_store.py) never change, so browsers can keep them
+HASHED_FRAME_PATH = re.compile(r"^/static/detected_frames/(thumbs/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
 
 # Ensure static folder exists for detected frames
 os.makedirs('static/detected_frames', exist_ok=True)
 
-@app.route('/alert', methods=['POST'])
-def receive_alert():
-    data = request.json
-    
-    alert = {
-        'id': len(alerts) + 1,
-        'latitude': data.get('latitude'),
-        'longitude': data.get('longitude'),
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+@app.after_request
+def compress_and_cache(response):
+    if response.status_code == 200 and HASHED_FRAME_PATH.match(request.path):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    if response.mimetype != 'application/json' or response.direct_passthrough:
+        return response
+    response.vary.add('Accept-Encoding')
+    if ('gzip' in request.accept_encodings and 'Content-Encoding' not in response.headers
+            and (response.content_length or 0) >= GZIP_MIN_BYTES):
+        response.set_data(gzip.compress(response.get_data(), compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def parse_coordinate(data, key, limit):
+    """Float value of an optional latitude/longitude field; raises ValueError when it's not one"""
+    value = data.get(key)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number") from None
+    if not -limit <= value <= limit:
+        raise ValueError(f"{key} out of range")
+    return value
+
+def parse_timestamp(data):
+    """Detection time in TIMESTAMP_FORMAT, or now when the detector didn't send one"""
+    value = data.get('timestamp')
+    if not value:
+        return datetime.now().strftime(TIMESTAMP_FORMAT)
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT).strftime(TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError("timestamp must look like YYYY-MM-DD HH:MM:SS") from None
+
+def alert_from_request(data):
+    """Alert row from a detector's JSON; raises ValueError for values the store can't use"""
+    return {
+        'latitude': parse_coordinate(data, 'latitude', 90),
+        'longitude': parse_coordinate(data, 'longitude', 180),
+        # Detectors send the detection time, so spooled alerts keep it when delivered late
+        'timestamp': parse_timestamp(data),
         'status': data.get('status', 'accident_detected'),
         'image_path': data.get('image_path'),
+        'thumbnail_path': data.get('thumbnail_path'),  # Small image for the alert list
         'address': data.get('address', 'Unknown location'),
         'acknowledged': False
     }
+
+@app.route('/alert', methods=['POST'])
+def receive_alert():
+    data = request.json
+    try:
+        alert = alert_from_request(data)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid alert: {e}"}), 400
+
+    alert = store.add(alert)
     
-    alerts.append(alert)
-    alerts.sort(key=lambda x: x['timestamp'], reverse=True)  # Keep newest first
-    
-    print(f"🚨 New alert #{alert['id']} at {alert['timestamp']}")
-    return jsonify({"message": "Alert received", "alert_id": alert['id']}), 200
+    notifier.notify()
+    print(f"🚨 New alert #{alert['id']} at {alert['timestamp']} (incident #{alert['incident_id']})")
+    return jsonify({"message": "Alert received", "alert_id": alert['id'], "incident_id": alert['incident_id']}), 200
+
+@app.route('/alerts/batch', methods=['POST'])
+def receive_alert_batch():
+    """Several alerts in one request, stored in one transaction.
+
+    The body is a JSON array of alerts (or {"alerts": [...]}), at most 1000 of them,
+    optionally gzip-compressed with Content-Encoding: gzip. Returns the new ids in order.
+    """
+    # The raw body is capped too, compressed or not; read one byte over to spot chunked bodies that are
+    if request.content_length is not None and request.content_length > MAX_BATCH_BYTES:
+        return jsonify({"error": "Batch body too large"}), 413
+    body = request.stream.read(MAX_BATCH_BYTES + 1)
+    if len(body) > MAX_BATCH_BYTES:
+        return jsonify({"error": "Batch body too large"}), 413
+
+    try:
+        if request.content_encoding == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decompressor.decompress(body, MAX_BATCH_BYTES)
+            if decompressor.unconsumed_tail:
+                return jsonify({"error": "Batch body too large"}), 413
+        data = json.loads(body)
+    except (zlib.error, ValueError) as e:
+        return jsonify({"error": f"Invalid batch body: {e}"}), 400
+
+    alerts = data.get('alerts') if isinstance(data, dict) else data
+    if not isinstance(alerts, list) or not all(isinstance(alert, dict) for alert in alerts):
+        return jsonify({"error": "Expected a list of alert objects"}), 400
+    if len(alerts) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} alerts per batch"}), 413
+
+    try:
+        alerts = [alert_from_request(alert) for alert in alerts]
+    except ValueError as e:
+        return jsonify({"error": f"Invalid alert: {e}"}), 400
+
+    alert_ids = store.add_many(alerts)
+    if alert_ids:
+        notifier.notify()
+        print(f"🚨 {len(alert_ids)} new alerts in batch (#{alert_ids[0]}-#{alert_ids[-1]})")
+    return jsonify({"message": "Alerts received", "alert_ids": alert_ids}), 200
 
 @app.route('/dashboard')
 def dashboard():
     return render_template("dashboard.html")
 
+def encode_cursor(item, key='timestamp'):
+    raw = json.dumps([item[key], item['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor):
+    timestamp, alert_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return timestamp, int(alert_id)
+
+def parse_bbox(value):
+    """'min_lon,min_lat,max_lon,max_lat' -> tuple of floats, or None when absent"""
+    if not value:
+        return None
+    bbox = tuple(float(v) for v in value.split(','))
+    if len(bbox) != 4:
+        raise ValueError("bbox needs 4 values")
+    return bbox
+
 @app.route('/api/alerts')
 def get_alerts():
-    return jsonify({
+    """Alerts, newest first, one page at a time.
+
+    Query parameters:
+      status, from, to           filter by status and timestamp window ("YYYY-MM-DD HH:MM:SS")
+      bbox                       min_lon,min_lat,max_lon,max_lat
+      limit, cursor              page size (max 500) and the next_cursor from the previous page
+      since                      only alerts created or changed after this version, oldest first
+    Responses carry an ETag; send it back in If-None-Match to get a 304 when nothing changed.
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+        bbox = parse_bbox(request.args.get('bbox'))
+        since = request.args.get('since')
+        since = int(since) if since is not None else None
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    # A since= client is only up to date once it has caught up with the current version
+    version = store.current_version()
+    etag = f"v{version}"
+    if (since is None or since >= version) and request.if_none_match.contains_weak(etag):
+        return '', 304, {'ETag': f'W/"{etag}"'}
+
+    next_cursor = None
+    if since is not None:
+        alerts = store.changes_since(since, limit=limit)
+        if len(alerts) == limit:
+            # A cut-off page: the client carries on from the last version it actually got
+            version = alerts[-1]['version']
+            etag = f"v{version}"
+    else:
+        alerts = store.query(
+            status=request.args.get('status'),
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            bbox=bbox,
+            after=after,
+            limit=limit,
+        )
+        if len(alerts) == limit:
+            next_cursor = encode_cursor(alerts[-1])
+
+    response = jsonify({
         'alerts': alerts,
-        'total': len(alerts),
+        'total': store.count(),
+        'version': version,
+        'next_cursor': next_cursor,
         'last_update': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
+    response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/api/alerts/nearby')
+def get_nearby_alerts():
+    """Alerts within radius_km (default 5, max 500) of lat,lon, nearest first"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        radius_km = min(float(request.args.get('radius_km', 5)), 500.0)
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and radius_km > 0):
+            raise ValueError("lat/lon out of range or radius_km not positive")
+    except KeyError as e:
+        return jsonify({"error": f"Missing query parameter: {e}"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    alerts = store.nearby(lat, lon, radius_km, status=request.args.get('status'), limit=limit)
+    return jsonify({'alerts': alerts, 'count': len(alerts)})
+
+@app.route('/api/alerts/bbox')
+def get_alerts_in_bbox():
+    """Alerts inside bbox=min_lon,min_lat,max_lon,max_lat, newest first (same paging as /api/alerts)"""
+    if not request.args.get('bbox'):
+        return jsonify({"error": "Missing query parameter: 'bbox'"}), 400
+    return get_alerts()
+
+@app.route('/api/alerts/clusters')
+def get_alert_clusters():
+    """Alert counts per map grid cell: cells are 360 / 2**zoom degrees wide.
+
+    Optional bbox (the visible map area) and status filters. Each cluster has its count,
+    the mean position of its alerts, the newest timestamp and the cell's bbox.
+    """
+    version = store.current_version()
+    etag = f"v{version}"
+    if request.if_none_match.contains_weak(etag):
+        return '', 304, {'ETag': f'W/"{etag}"'}
+
+    try:
+        zoom = int(request.args.get('zoom', 10))
+        if not 0 <= zoom <= 24:
+            raise ValueError("zoom must be between 0 and 24")
+        bbox = parse_bbox(request.args.get('bbox'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    clusters = store.clusters(zoom, bbox=bbox, status=request.args.get('status'))
+    response = jsonify({'clusters': clusters, 'zoom': zoom, 'version': version})
+    response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/api/incidents')
+def get_incidents():
+    """Incidents (merged alerts), most recently seen first, each with its alert count and frames.
+
+    Takes the same status, from, to, bbox, limit and cursor parameters as /api/alerts,
+    with from/to applied to the incident's last sighting.
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+        bbox = parse_bbox(request.args.get('bbox'))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    incidents = store.query_incidents(
+        status=request.args.get('status'),
+        start=request.args.get('from'),
+        end=request.args.get('to'),
+        bbox=bbox,
+        after=after,
+        limit=limit,
+    )
+    response = jsonify({
+        'incidents': incidents,
+        'total': store.count('incidents'),
+        'version': version,
+        'next_cursor': encode_cursor(incidents[-1], key='last_seen') if len(incidents) == limit else None,
+    })
+    response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/api/incidents/<int:incident_id>')
+def get_incident(incident_id):
+    incident = store.get_incident(incident_id)
+    if incident is None:
+        return jsonify({"error": "Incident not found"}), 404
+    return jsonify(incident)
+
+@app.route('/api/alerts/stream')
+def stream_alerts():
+    """Server-sent events: an `alert` event per new alert and a `status` event per status change.
+
+    Each event id is the alert's version. Browsers resume from the last one they saw by
+    sending Last-Event-ID when they reconnect; other clients can pass ?since=<version>.
+    Without either, the stream starts with changes made after the client connected.
+    """
+    last_seen = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        version = int(last_seen) if last_seen else store.current_version()
+    except ValueError:
+        return jsonify({"error": "Invalid event id"}), 400
+
+    def generate(version):
+        yield "retry: 3000\n\n"
+        # Alerts created after the client's starting point are new to it the first time they're sent
+        start_version = version
+        sent_ids = set()
+        seen_changes = notifier.changes
+        idle = 0
+        while True:
+            changes = store.changes_since(version, limit=MAX_PAGE_SIZE)
+            for alert in changes:
+                is_new = alert['created_version'] > start_version and alert['id'] not in sent_ids
+                event = 'alert' if is_new else 'status'
+                sent_ids.add(alert['id'])
+                version = alert['version']
+                yield format_sse(alert, event=event, event_id=version)
+            if len(changes) == MAX_PAGE_SIZE:
+                continue  # More backlog to replay
+
+            latest = notifier.wait(seen_changes, STREAM_POLL_SECONDS)
+            if latest != seen_changes:
+                seen_changes = latest
+                idle = 0
+                continue
+
+            idle += STREAM_POLL_SECONDS
+            if idle >= STREAM_HEARTBEAT_SECONDS:
+                idle = 0
+                yield ": keepalive\n\n"  # Keeps proxies from closing an idle stream
+
+    return Response(
+        stream_with_context(generate(version)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 @app.route("/update_status", methods=["POST"])
 def update_status():
@@ -48,15 +362,26 @@ def update_status():
     alert_id = data.get("id")
     new_status = data.get("status")
     
-    for alert in alerts:
-        if alert['id'] == alert_id:
-            alert['status'] = new_status
-            return jsonify({"message": f"Alert {alert_id} status updated to {new_status}"})
+    if store.update_status(alert_id, new_status):
+        notifier.notify()
+        return jsonify({"message": f"Alert {alert_id} status updated to {new_status}"})
     
     return jsonify({"error": "Alert not found"}), 404
 
+@app.route("/update_incident_status", methods=["POST"])
+def update_incident_status():
+    data = request.json
+    incident_id = data.get("id")
+    new_status = data.get("status")
+
+    if store.update_incident_status(incident_id, new_status):
+        notifier.notify()
+        return jsonify({"message": f"Incident {incident_id} status updated to {new_status}"})
+
+    return jsonify({"error": "Incident not found"}), 404
+
 if __name__ == '__main__':
-    # Add some sample alerts for testing
+    # Add some sample alerts for testing (only into an empty database)
     sample_locations = [
         {"latitude": 29.9058, "longitude": 77.8375, "address": "RIT ROORKEE"},
         {"latitude": 29.5152, "longitude": 77.5347, "address": "IIT ROORKEE"},
@@ -64,16 +389,17 @@ if __name__ == '__main__':
         {"latitude": 29.394764, "longitude": 79.126503, "address": "Quantum university"}
     ]
     
-    for i, loc in enumerate(sample_locations):
-        alerts.append({
-            'id': i + 1,
-            **loc,
-            'timestamp': (datetime.now() - timedelta(minutes=(i+1)*15)).strftime("%Y-%m-%d %H:%M:%S"),
-            'status': random.choice(['accident_detected', 'under_review', 'resolved']),
-            'image_path': f"/static/detected_frames/sample_{i+1}.jpg",
-            'acknowledged': False
-        })
+    if store.count() == 0:
+        for i, loc in enumerate(sample_locations):
+            store.add({
+                **loc,
+                'timestamp': (datetime.now() - timedelta(minutes=(i+1)*15)).strftime("%Y-%m-%d %H:%M:%S"),
+                'status': random.choice(['accident_detected', 'under_review', 'resolved']),
+                'image_path': f"/static/detected_frames/sample_{i+1}.jpg",
+                'acknowledged': False
+            })
     
+    # Development server only; in production run `gunicorn -c gunicorn.conf.py wsgi:app`
     print("🚀 Starting Netra 2.0 Dashboard Server")
     print("📊 Dashboard: http://localhost:5000/dashboard")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=os.environ.get("NETRA_DEBUG", "0") == "1", host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
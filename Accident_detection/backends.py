@@ -0,0 +1,196 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+
+def load_model(weights, backend="torch", threads=None, int8=False, imgsz=640, calibration_data=None):
+    """Load the detector on the chosen inference backend.
+
+    "torch" runs the .pt weights as before. "onnx" and "openvino" export the same weights
+    next to the .pt file on first use (with a dynamic batch size, so batched inference keeps
+    working) and load the exported model. `threads` caps the CPU threads the backend uses,
+    and `int8` switches to an INT8-quantized model, calibrated on accident footage: static
+    QDQ quantization for ONNX, NNCF for OpenVINO. Calibration images come from the dataset
+    YAML in `calibration_data`, or else the one the weights were trained on (args.yaml);
+    INT8 is refused when neither can be found, rather than calibrating on unrelated images.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+
+    weights = Path(weights)
+    print(f"🧠 Loading {weights.name} on {backend}{' (INT8)' if int8 else ''}")
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return YOLO(str(weights))
+
+    if backend == "onnx":
+        path = export_onnx(weights, int8=int8, imgsz=imgsz, calibration_data=calibration_data)
+        model = YOLO(str(path), task="detect")
+        if threads:
+            _set_onnx_threads(model, path, threads, imgsz)
+        return model
+
+    path = export_openvino(weights, int8=int8, imgsz=imgsz, calibration_data=calibration_data)
+    model = YOLO(str(path), task="detect")
+    if threads:
+        _set_openvino_threads(model, path, threads, imgsz)
+    return model
+
+
+def load_model_from_env(weights):
+    """Backend switch for the entry points: NETRA_BACKEND, NETRA_THREADS, NETRA_INT8=1 and
+    NETRA_CALIBRATION_DATA (dataset YAML for INT8 calibration)"""
+    threads = os.environ.get("NETRA_THREADS")
+    return load_model(
+        weights,
+        backend=os.environ.get("NETRA_BACKEND", "torch"),
+        threads=int(threads) if threads else None,
+        int8=os.environ.get("NETRA_INT8") == "1",
+        calibration_data=os.environ.get("NETRA_CALIBRATION_DATA"),
+    )
+
+
+def export_onnx(weights, int8=False, imgsz=640, calibration_data=None):
+    onnx_path = weights.with_suffix(".onnx")
+    if not onnx_path.exists():
+        print(f"📦 Exporting {weights.name} to ONNX")
+        onnx_path = Path(YOLO(str(weights)).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True))
+
+    if not int8:
+        return onnx_path
+
+    int8_path = onnx_path.with_name(f"{onnx_path.stem}.int8.onnx")
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+        images = _calibration_images(_calibration_data(weights, calibration_data))
+        print(f"📦 Quantizing {onnx_path.name} to INT8 ({len(images)} calibration images)")
+        # Static QDQ quantization: ORT fuses it into real INT8 convolutions, where dynamic
+        # quantization leaves ConvInteger ops that are rarely faster than FP32 on CPU
+        quantize_static(
+            str(onnx_path), str(int8_path), _CalibrationReader(onnx_path, images, imgsz),
+            quant_format=QuantFormat.QDQ, per_channel=True,
+            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+        )
+    return int8_path
+
+
+def export_openvino(weights, int8=False, imgsz=640, calibration_data=None):
+    model_dir = weights.with_name(f"{weights.stem}{'_int8' if int8 else ''}_openvino_model")
+    if model_dir.exists():
+        return model_dir
+
+    export_args = {"format": "openvino", "imgsz": imgsz, "dynamic": True, "int8": int8}
+    if int8:
+        # Without `data` Ultralytics calibrates on its default dataset, not accident footage
+        export_args["data"] = str(_calibration_data(weights, calibration_data))
+    print(f"📦 Exporting {weights.name} to OpenVINO")
+    return Path(YOLO(str(weights)).export(**export_args))
+
+
+def _calibration_data(weights, calibration_data=None):
+    """Dataset YAML to calibrate INT8 models on; raises ValueError if there is none"""
+    data = calibration_data or _training_data(weights)
+    if not data or not Path(data).exists():
+        raise ValueError(
+            f"INT8 needs calibration images from the accident dataset, but no dataset YAML was found "
+            f"({data or 'none in args.yaml'}); set NETRA_CALIBRATION_DATA or run without INT8"
+        )
+    return Path(data)
+
+
+def _training_data(weights):
+    # runs/detect/<run>/weights/best.pt -> runs/detect/<run>/args.yaml
+    args_file = weights.parent.parent / "args.yaml"
+    if not args_file.exists():
+        return None
+    with open(args_file) as f:
+        return yaml.safe_load(f).get("data")
+
+
+def _calibration_images(data_yaml, limit=200):
+    """Validation (or training) images of an Ultralytics dataset YAML"""
+    with open(data_yaml) as f:
+        config = yaml.safe_load(f)
+    root = Path(config.get("path") or data_yaml.parent)
+    if not root.is_absolute():
+        root = data_yaml.parent / root
+    split = config.get("val") or config.get("train") or []
+    images = []
+    for entry in split if isinstance(split, list) else [split]:
+        folder = root / entry
+        images.extend(sorted(p for p in folder.rglob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png")))
+    if not images:
+        raise ValueError(f"No calibration images found for {data_yaml}")
+    return images[:limit]
+
+
+class _CalibrationReader:
+    """Feeds calibration images to onnxruntime, preprocessed the way Ultralytics does it"""
+
+    def __init__(self, onnx_path, images, imgsz):
+        import onnxruntime as ort
+        self.input_name = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        self.images = iter(images)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        import cv2
+        for path in self.images:
+            image = cv2.imread(str(path))
+            if image is None:
+                continue
+            # Letterbox to imgsz x imgsz with Ultralytics' grey padding, BGR -> RGB, CHW, 0..1
+            scale = self.imgsz / max(image.shape[:2])
+            image = cv2.resize(image, (round(image.shape[1] * scale), round(image.shape[0] * scale)))
+            canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+            top = (self.imgsz - image.shape[0]) // 2
+            left = (self.imgsz - image.shape[1]) // 2
+            canvas[top:top + image.shape[0], left:left + image.shape[1]] = image
+            tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255
+            return {self.input_name: np.ascontiguousarray(tensor)}
+        return None
+
+
+def _warm_up(model, imgsz):
+    # Ultralytics builds its runtime session lazily on the first prediction
+    model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+    return model.predictor.model
+
+
+def _set_onnx_threads(model, path, threads, imgsz):
+    import onnxruntime as ort
+
+    backend = _warm_up(model, imgsz)
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    try:
+        backend.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+    except Exception as e:
+        print(f"⚠️ Could not apply ONNX Runtime thread count: {e}")
+
+
+def _set_openvino_threads(model, path, threads, imgsz):
+    import openvino as ov
+
+    backend = _warm_up(model, imgsz)
+    try:
+        core = ov.Core()
+        xml = next(Path(path).glob("*.xml"))
+        ov_model = core.read_model(model=str(xml), weights=str(xml.with_suffix(".bin")))
+        if ov_model.get_parameters()[0].get_layout().empty:
+            ov_model.get_parameters()[0].set_layout(ov.Layout("NCHW"))
+        backend.ov_compiled_model = core.compile_model(
+            ov_model, device_name="CPU", config={"INFERENCE_NUM_THREADS": threads}
+        )
+    except Exception as e:
+        print(f"⚠️ Could not apply OpenVINO thread count: {e}")
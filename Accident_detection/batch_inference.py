@@ -0,0 +1,120 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchInferenceEngine:
+    """Collects frames from many camera streams and runs them through the model in batches.
+
+    Streams call `infer(frame)` (or `submit(frame)` for a Future) from their own threads.
+    A single worker thread waits for the first frame, keeps collecting until it has
+    `max_batch_size` frames or `max_wait` seconds have passed, runs one forward pass
+    and hands every result back to the stream that submitted the frame.
+
+    Streams that block on `infer()` have at most one frame in flight, so streams announce
+    themselves with `register_stream()` / `unregister_stream()` and the worker stops waiting
+    once it has a frame from each of them; a single stream never waits for `max_wait`.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait=0.02, **predict_kwargs):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.predict_kwargs = predict_kwargs
+        self.requests = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.active_streams = 0
+        self.streams_lock = threading.Lock()
+
+        # Simple counters for monitoring batch efficiency
+        self.batches_run = 0
+        self.frames_run = 0
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def register_stream(self):
+        with self.streams_lock:
+            self.active_streams += 1
+
+    def unregister_stream(self):
+        with self.streams_lock:
+            self.active_streams = max(0, self.active_streams - 1)
+
+    def submit(self, frame):
+        future = Future()
+        self.requests.put((frame, future))
+        return future
+
+    def infer(self, frame):
+        return self.submit(frame).result()
+
+    @property
+    def average_batch_size(self):
+        return self.frames_run / self.batches_run if self.batches_run else 0.0
+
+    def _collect_batch(self):
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        # No point waiting for more frames than there are streams to send them
+        expected = min(self.max_batch_size, max(1, self.active_streams))
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < expected:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Still take anything already queued, e.g. from callers that never registered
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            frames = [frame for frame, _ in batch]
+            try:
+                results = self.model(frames, **self.predict_kwargs)
+            except Exception as e:
+                print(f"❌ Batch inference error: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.frames_run += len(frames)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+        # Don't leave any stream waiting forever after shutdown
+        while True:
+            try:
+                _, future = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("Batch inference engine stopped"))
@@ -0,0 +1,162 @@
+"""Headless benchmark for the detection pipeline.
+
+Replays a video through the same stages as main.py / server.py (decode, inference,
+annotation, JPEG encode, base64) and reports per-stage latency percentiles, end-to-end
+throughput and peak memory for every backend and batch size asked for. Each configuration
+runs in a fresh process, because peak RSS can only grow within one:
+
+    python benchmark.py --video videos/accident.mp4 --backends torch onnx --batch-sizes 1 4 8
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, load_model
+
+STAGES = ("decode", "inference", "plot", "jpeg", "base64")
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def read_frame(cap, video):
+    """Next frame, starting the video over at the end so any frame count can be replayed"""
+    ret, frame = cap.read()
+    if not ret:
+        cap.open(video)
+        ret, frame = cap.read()
+        if not ret:
+            raise RuntimeError(f"Could not read frames from {video}")
+    return frame
+
+
+def run(model, video, frames, batch_size, warmup):
+    """Replay `frames` frames in batches of `batch_size`; returns per-stage timings in seconds"""
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video {video}")
+
+    # Warm-up batches let the backend allocate and compile before anything is measured
+    for _ in range(warmup):
+        model([read_frame(cap, video) for _ in range(batch_size)], verbose=False)
+
+    timings = {stage: [] for stage in STAGES}
+    processed = 0
+    start = time.perf_counter()
+    while processed < frames:
+        batch = []
+        for _ in range(min(batch_size, frames - processed)):
+            t0 = time.perf_counter()
+            batch.append(read_frame(cap, video))
+            timings["decode"].append(time.perf_counter() - t0)
+
+        # One forward pass per batch; every frame in it waits for the whole batch
+        t0 = time.perf_counter()
+        results = model(batch, verbose=False)
+        timings["inference"].append(time.perf_counter() - t0)
+
+        for frame, result in zip(batch, results):
+            t0 = time.perf_counter()
+            annotated = result.plot(img=frame)
+            t1 = time.perf_counter()
+            _, jpeg = cv2.imencode(".jpg", annotated)
+            t2 = time.perf_counter()
+            base64.b64encode(jpeg.tobytes()).decode("utf-8")
+            t3 = time.perf_counter()
+            timings["plot"].append(t1 - t0)
+            timings["jpeg"].append(t2 - t1)
+            timings["base64"].append(t3 - t2)
+        processed += len(batch)
+
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return timings, elapsed
+
+
+def summarize(backend, batch_size, timings, elapsed, frames):
+    stages = {}
+    for stage, values in timings.items():
+        ms = np.array(values) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        stages[stage] = {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+                         "mean_ms": round(ms.mean(), 2)}
+    return {
+        "backend": backend,
+        "batch_size": batch_size,
+        "frames": frames,
+        "throughput_fps": round(frames / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": stages,
+    }
+
+
+def measure(weights, backend, threads, int8, calibration_data, imgsz, video, frames, batch_size, warmup):
+    """Load the model and benchmark one configuration; runs in its own process"""
+    model = load_model(weights, backend=backend, threads=threads, int8=int8, imgsz=imgsz,
+                       calibration_data=calibration_data)
+    timings, elapsed = run(model, video, frames, batch_size, warmup)
+    return summarize(backend, batch_size, timings, elapsed, frames)
+
+
+def print_report(report):
+    print(f"\n📊 {report['backend']} | batch {report['batch_size']} | {report['frames']} frames | "
+          f"{report['throughput_fps']} FPS | peak RSS {report['peak_rss_mb']} MB")
+    print(f"   {'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for stage, stats in report["stages"].items():
+        label = "inference/batch" if stage == "inference" else stage
+        print(f"   {label:<16}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+              f"{stats['mean_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Netra detection pipeline on a local video")
+    parser.add_argument("--video", default="videos/accident.mp4")
+    parser.add_argument("--weights", default="runs/detect/train20/weights/best.pt")
+    parser.add_argument("--backends", nargs="+", default=["torch"], choices=BACKENDS)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1])
+    parser.add_argument("--frames", type=int, default=300, help="Frames to measure per configuration")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured batches before each run")
+    parser.add_argument("--threads", type=int, help="CPU threads for the inference backend")
+    parser.add_argument("--int8", action="store_true", help="Use INT8-quantized onnx/openvino models")
+    parser.add_argument("--calibration-data", help="Dataset YAML to calibrate INT8 models on (default: from args.yaml)")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    reports = []
+    context = multiprocessing.get_context("spawn")  # Fresh interpreter, nothing inherited from earlier runs
+    for backend in args.backends:
+        for batch_size in args.batch_sizes:
+            print(f"⏱️ Running {backend} with batch size {batch_size}...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                report = pool.submit(measure, args.weights, backend, args.threads, args.int8,
+                                     args.calibration_data, args.imgsz, args.video, args.frames,
+                                     batch_size, args.warmup).result()
+            print_report(report)
+            reports.append(report)
+
+    if len(reports) > 1:
+        print(f"\n🏁 {'backend':<10}{'batch':>6}{'FPS':>10}{'infer p95 ms':>14}")
+        for report in reports:
+            print(f"   {report['backend']:<10}{report['batch_size']:>6}{report['throughput_fps']:>10.2f}"
+                  f"{report['stages']['inference']['p95_ms']:>14.2f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"💾 Results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
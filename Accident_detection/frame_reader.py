@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameReader:
+    """Decodes a video source on a background thread into a ring of preallocated frames.
+
+    `read()` works like `cv2.VideoCapture.read()`. The array it returns is a ring slot
+    that stays valid until the next `read()` call; copy it if you need it for longer.
+    With `loop=True` the source rewinds when it ends, like the
+    `cap.set(cv2.CAP_PROP_POS_FRAMES, 0)` calls it replaces. Hardware decoding is
+    requested when OpenCV supports it and quietly falls back to software otherwise.
+    """
+
+    def __init__(self, source, buffer_size=4, loop=True, hw_accel=True):
+        self.source = source
+        self.buffer_size = buffer_size
+        self.loop = loop
+
+        self.cap = self._open(source, hw_accel)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0.0
+
+        self.slots = []
+        self.free_slots = queue.Queue()
+        self.ready = queue.Queue()
+        self.current_slot = None
+        self.pending_seek = None
+        self.generation = 0  # Bumped on every seek so frames decoded before it are dropped
+        self.seek_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Decode rate, measured over the last second or so
+        self.decode_fps = 0.0
+        self._fps_count = 0
+        self._fps_start = time.monotonic()
+
+    def _open(self, source, hw_accel):
+        if hw_accel and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            cap = cv2.VideoCapture(
+                source, cv2.CAP_ANY, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+            )
+            if cap.isOpened():
+                return cap
+        return cv2.VideoCapture(source)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        if self.thread is None and self.cap.isOpened():
+            ok, first = self.cap.read()
+            if not ok:
+                return self
+
+            # Preallocate the ring once the frame size is known; the decoder writes into these
+            self.slots = [np.empty_like(first) for _ in range(self.buffer_size)]
+            self.slots[0][...] = first
+            self.ready.put((0, self.generation))
+            for i in range(1, self.buffer_size):
+                self.free_slots.put(i)
+
+            self.thread = threading.Thread(target=self._run, name=f"reader-{self.source}", daemon=True)
+            self.thread.start()
+        return self
+
+    def read(self, timeout=None):
+        if self.thread is None:
+            self.start()
+        if self.current_slot is not None:
+            self.free_slots.put(self.current_slot)
+            self.current_slot = None
+
+        while True:
+            try:
+                item = self.ready.get(timeout=timeout)
+            except queue.Empty:
+                return False, None
+            if item is None:
+                self.ready.put(None)  # Keep reporting end of stream on later calls
+                return False, None
+
+            slot, generation = item
+            if generation != self.generation:
+                self.free_slots.put(slot)  # Decoded before the last seek
+                continue
+            self.current_slot = slot
+            return True, self.slots[slot]
+
+    def seek(self, frame_index=0):
+        with self.seek_lock:
+            self.pending_seek = frame_index
+            self.generation += 1
+
+    def release(self):
+        self.stop_event.set()
+        # Unblock the decoder if it is waiting for a free slot
+        self.free_slots.put(None)
+        if self.thread is not None:
+            self.thread.join(2.0)
+            self.thread = None
+        self.cap.release()
+
+    def __iter__(self):
+        try:
+            while True:
+                ok, frame = self.read()
+                if not ok:
+                    break
+                yield frame
+        finally:
+            self.release()
+
+    def _count_frame(self):
+        self._fps_count += 1
+        elapsed = time.monotonic() - self._fps_start
+        if elapsed >= 1.0:
+            self.decode_fps = round(self._fps_count / elapsed, 2)
+            self._fps_count = 0
+            self._fps_start = time.monotonic()
+
+    def _run(self):
+        try:
+            self._decode_loop()
+        except Exception as e:
+            print(f"❌ Frame reader error ({self.source}): {e}")
+        finally:
+            self.ready.put(None)
+
+    def _decode_loop(self):
+        while not self.stop_event.is_set():
+            slot = self.free_slots.get()
+            if slot is None:
+                break
+
+            with self.seek_lock:
+                seek_to, self.pending_seek = self.pending_seek, None
+                generation = self.generation
+            if seek_to is not None:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, seek_to)
+
+            ok, frame = self.cap.read(self.slots[slot])
+            if not ok and self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.cap.read(self.slots[slot])
+            if not ok:
+                break
+
+            # OpenCV allocates a new array if the stream's frame size changed
+            if frame is not self.slots[slot]:
+                self.slots[slot] = frame
+
+            self._count_frame()
+            self.ready.put((slot, generation))
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import threading
+import time
+
+import cv2
+
+
+class FrameStore:
+    """Content-addressed storage for alert frames, with thumbnails and a retention policy.
+
+    Frames are saved as JPEGs named by the SHA-256 of their encoded bytes and sharded into
+    `ab/cd/<hash>.jpg` so no directory grows huge; saving the same frame twice reuses the
+    file instead of overwriting another alert's image. Each frame also gets a `thumb_width`
+    wide thumbnail under `thumbs/` for list views. Writes go through a temp file and
+    `os.replace`, so the web server never serves a half-written image.
+
+    `cleanup()` deletes frames older than `max_age` seconds and then the oldest frames until
+    the store is under `max_bytes`; `start_cleanup()` runs it on a background thread.
+    """
+
+    def __init__(self, root="static/detected_frames", url_prefix="/static/detected_frames",
+                 thumb_width=320, quality=90, max_bytes=2 * 1024 ** 3, max_age=30 * 86400):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip("/")
+        self.thumb_width = thumb_width
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stop_event = threading.Event()
+        self.thread = None
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def shard_path(digest):
+        return os.path.join(digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def url(self, relpath):
+        return f"{self.url_prefix}/{relpath.replace(os.sep, '/')}"
+
+    def save(self, frame):
+        """Store a frame and its thumbnail; returns the image_path and thumbnail_path URLs"""
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("Could not encode frame as JPEG")
+        data = jpeg.tobytes()
+        relpath = self.shard_path(hashlib.sha256(data).hexdigest())
+        thumb_relpath = os.path.join("thumbs", relpath)
+
+        self._write(relpath, lambda: data)
+        self._write(thumb_relpath, lambda: self._thumbnail(frame))
+        return {"image_path": self.url(relpath), "thumbnail_path": self.url(thumb_relpath)}
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        if width > self.thumb_width:
+            size = (self.thumb_width, max(1, round(height * self.thumb_width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if not ok:
+            raise ValueError("Could not encode thumbnail as JPEG")
+        return jpeg.tobytes()
+
+    def _write(self, relpath, encode):
+        path = os.path.join(self.root, relpath)
+        if os.path.exists(path):
+            os.utime(path)  # Same content already stored; refresh it for the age policy
+            return
+        data = encode()
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        for attempt in range(2):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                break
+            except FileNotFoundError:
+                if attempt:  # Cleanup pruned the shard directory in between; recreate it once
+                    raise
+        os.replace(tmp_path, path)
+
+    def _frames(self):
+        """(mtime, size, relpath) of every stored frame, excluding thumbnails"""
+        frames = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root:
+                # Only the sharded layout is managed; leave older top-level files alone
+                dirnames[:] = [d for d in dirnames if d != "thumbs"]
+                continue
+            for name in filenames:
+                if not name.endswith(".jpg"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                frames.append((stat.st_mtime, stat.st_size, os.path.relpath(path, self.root)))
+        return frames
+
+    def _remove(self, relpath):
+        freed = 0
+        for path in (os.path.join(self.root, relpath), os.path.join(self.root, "thumbs", relpath)):
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            self._prune(os.path.dirname(path))
+        return freed
+
+    def _prune(self, directory):
+        # Remove shard directories left empty, stopping at the store root
+        while os.path.abspath(directory) != os.path.abspath(self.root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return  # Not empty
+            directory = os.path.dirname(directory)
+
+    def cleanup(self):
+        """Apply the age and size limits; returns (frames removed, bytes freed)"""
+        frames = sorted(self._frames())
+        thumbs_size = sum(
+            os.path.getsize(os.path.join(dirpath, name))
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, "thumbs"))
+            for name in filenames if name.endswith(".jpg")
+        )
+        total = sum(size for _, size, _ in frames) + thumbs_size
+        cutoff = time.time() - self.max_age
+        removed = freed = 0
+        for mtime, _, relpath in frames:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break  # Oldest first, so everything after this is within both limits
+            bytes_freed = self._remove(relpath)
+            total -= bytes_freed
+            freed += bytes_freed
+            removed += 1
+        return removed, freed
+
+    def start_cleanup(self, interval=600.0):
+        """Run cleanup() now and then every `interval` seconds on a daemon thread"""
+        def run():
+            while True:
+                try:
+                    removed, freed = self.cleanup()
+                    if removed:
+                        print(f"🧹 Removed {removed} old alert frames ({freed / 1024 ** 2:.1f} MB)")
+                except Exception as e:
+                    print(f"❌ Error cleaning up alert frames: {e}")
+                if self.stop_event.wait(interval):
+                    break
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=run, name="frame-store-cleanup", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
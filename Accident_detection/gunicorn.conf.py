@@ -0,0 +1,19 @@
+# Gunicorn settings for the alert server: gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.environ.get("NETRA_ALERT_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("NETRA_ALERT_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+
+# Threaded workers, because every open /api/alerts/stream connection holds a thread
+worker_class = "gthread"
+threads = int(os.environ.get("NETRA_ALERT_THREADS", "16"))
+keepalive = 5
+graceful_timeout = 10
+
+# Create and migrate the SQLite store once in the master, before the workers fork
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("NETRA_LOG_LEVEL", "info")
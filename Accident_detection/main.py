@@ -1,18 +1,35 @@
-from ultralytics import YOLO
-import requests
 import datetime
 import os
 import cv2
 import random
+from motion_gate import MotionGate
+from frame_reader import FrameReader
+from backends import load_model_from_env
+from accident_confirmation import confirmer_from_env
+from alert_outbox import AlertOutbox
+from frame_store import FrameStore
 
-# Load YOLOv8 model
-model = YOLO("runs/detect/train20/weights/best.pt")
+# Load YOLOv8 model (NETRA_BACKEND=torch|onnx|openvino picks the inference runtime)
+model = load_model_from_env("runs/detect/train20/weights/best.pt")
 video_path = "videos/accident.mp4"
-save_frame_dir = "static/detected_frames"
-os.makedirs(save_frame_dir, exist_ok=True)
+
+# Alert frames are stored by content hash with thumbnails; old frames are pruned by size and age
+frame_store = FrameStore(
+    "static/detected_frames",
+    max_bytes=int(float(os.environ.get("NETRA_FRAME_STORE_MB", "2048")) * 1024 ** 2),
+    max_age=float(os.environ.get("NETRA_FRAME_RETENTION_DAYS", "30")) * 86400,
+)
+
+# Skip inference on static frames, but re-check at least every 5th frame
+motion_gate = MotionGate(motion_threshold=0.02, max_skip=5)
 
 # Alert API configuration
 alert_url = "http://localhost:5000/alert"
+alert_batch_url = "http://localhost:5000/alerts/batch"
+
+# Alerts are saved and posted by a background worker, spooled to disk while the server is down
+# and re-sent in batches once it is back
+outbox = AlertOutbox(alert_url, spool_dir="alert_spool", frame_store=frame_store, batch_url=alert_batch_url)
 
 # Roorkee locations data
 roorkee_locations = [
@@ -39,11 +56,8 @@ roorkee_locations = [
 ]
 
 def send_alert(frame):
-    """Send alert to dashboard with detection frame"""
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"accident_{timestamp}.jpg"
-    filepath = os.path.join(save_frame_dir, filename)
-    cv2.imwrite(filepath, frame)
+    """Queue an alert for the dashboard with the detection frame; never blocks on the network"""
+    now = datetime.datetime.now()
     
     # Select random Roorkee location
     location = random.choice(roorkee_locations)
@@ -52,32 +66,29 @@ def send_alert(frame):
         "latitude": location["latitude"],
         "longitude": location["longitude"],
         "address": location["name"],
-        "image_path": f"/static/detected_frames/{filename}",
-        "status": "accident_detected"
+        "status": "accident_detected",
+        "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")
     }
 
-    try:
-        response = requests.post(alert_url, json=payload)
-        if response.status_code == 200:
-            print(f"✅ Alert sent successfully from {location['name']}!")
-        else:
-            print(f"⚠️ Failed to send alert. Status code: {response.status_code}")
-    except Exception as e:
-        print(f"❌ Error sending alert: {str(e)}")
+    # The outbox worker saves the frame and fills in image_path and thumbnail_path
+    outbox.submit(payload, frame=frame)
 
 def main():
     print("🔍 Starting Roorkee Accident Detection System...")
     print("Press SPACE to pause/resume, ESC to exit")
     
-    cap = cv2.VideoCapture(video_path)
+    # Decode on a background thread so it overlaps with inference; loops at the end of the file
+    cap = FrameReader(video_path, loop=True)
     if not cap.isOpened():
         print("❌ Error opening video file")
         return
     
+    frame_store.start_cleanup()
     paused = False
     consecutive_detections = 0
-    alert_sent = False
+    confirmer = confirmer_from_env()
     current_frame = None
+    results = None
     
     while True:
         # Always check for key presses
@@ -102,26 +113,28 @@ def main():
         if not paused:
             ret, frame = cap.read()
             if not ret:
-                # Loop video when ended
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                continue
+                print("❌ Video stream ended")
+                break
                 
             current_frame = frame.copy()
-            results = model(frame)
-            annotated_frame = results[0].plot()
+
+            # Reuse the last result on quiet frames; always re-run while something is detected
+            force = results is None or len(results[0].boxes) > 0
+            if motion_gate.should_infer(frame, force=force):
+                results = model(frame)
+            annotated_frame = results[0].plot(img=frame)
             
             # Check for detections
             if len(results[0].boxes) > 0:
                 consecutive_detections += 1
                 print(f"⚠️ Accident detected ({consecutive_detections} consecutive frames)")
-                
-                # Send alert after 5 consecutive detections
-                if consecutive_detections >= 5 and not alert_sent:
-                    send_alert(frame)
-                    alert_sent = True
             else:
                 consecutive_detections = 0
-                alert_sent = False
+
+            # Send one alert per tracked accident once it has been seen in 5 frames
+            for track in confirmer.update_from_result(results[0]):
+                print(f"🚨 Accident confirmed (track #{track.id}, conf {track.mean_confidence:.2f})")
+                send_alert(frame)
             
             # Display the processed frame
             cv2.imshow('Roorkee Accident Detection (SPACE=pause, ESC=exit)', annotated_frame)
@@ -135,8 +148,11 @@ def main():
                 cv2.imshow('Roorkee Accident Detection (SPACE=pause, ESC=exit)', paused_frame)
     
     # Cleanup
+    print(f"📊 Decode rate: {cap.decode_fps} FPS")
     cap.release()
     cv2.destroyAllWindows()
+    outbox.close()
+    frame_store.stop()
     print("🛑 Detection stopped")
 
 if __name__ == '__main__':
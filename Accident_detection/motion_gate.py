@@ -0,0 +1,50 @@
+import cv2
+
+
+class MotionGate:
+    """Decides whether a frame is worth running through the model.
+
+    Each frame is shrunk, converted to grayscale and compared with the last frame that
+    was actually inferred. The model runs when the share of changed pixels reaches
+    `motion_threshold`, when the caller forces it, or after `max_skip` skipped frames
+    so a static scene (e.g. a stopped wreck) is still re-checked regularly.
+    """
+
+    def __init__(self, motion_threshold=0.02, pixel_threshold=25, max_skip=5, width=160):
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_skip = max_skip
+        self.width = width
+        self.reference = None
+        self.skipped = 0
+
+        # Counters to see how much work the gate is saving
+        self.frames_seen = 0
+        self.frames_inferred = 0
+
+    def motion_score(self, small):
+        if self.reference is None or self.reference.shape != small.shape:
+            return 1.0
+        diff = cv2.absdiff(small, self.reference)
+        changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+        return changed / diff.size
+
+    def should_infer(self, frame, force=False):
+        self.frames_seen += 1
+
+        height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if force or self.skipped >= self.max_skip or self.motion_score(small) >= self.motion_threshold:
+            self.reference = small
+            self.skipped = 0
+            self.frames_inferred += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    @property
+    def skip_ratio(self):
+        return 1 - self.frames_inferred / self.frames_seen if self.frames_seen else 0.0
@@ -0,0 +1,105 @@
+import queue
+import threading
+
+
+class StagePipeline:
+    """Runs a frame source and a chain of processing stages on worker threads joined by bounded queues.
+
+    `source` is an iterable of frames; a generator source is closed when the pipeline stops.
+    Each stage takes the previous stage's output and returns the next item, or None to drop it.
+    The last stage's output is handed to `sink`. `on_exit` is called once when the pipeline stops.
+    """
+
+    def __init__(self, source, stages, sink, on_exit=None, queue_size=2, name="pipeline"):
+        self.source = source
+        self.stages = stages
+        self.sink = sink
+        self.on_exit = on_exit
+        self.queue_size = queue_size
+        self.name = name
+        self.stop_event = threading.Event()
+        self.threads = []
+        self._exit_lock = threading.Lock()
+        self._exited = False
+
+    def start(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+
+        self.threads.append(threading.Thread(
+            target=self._run_source, args=(queues[0],), name=f"{self.name}-source", daemon=True
+        ))
+        for i, stage in enumerate(self.stages):
+            out_queue = queues[i + 1] if i + 1 < len(queues) else None
+            self.threads.append(threading.Thread(
+                target=self._run_stage, args=(stage, queues[i], out_queue),
+                name=f"{self.name}-{getattr(stage, '__name__', i)}", daemon=True
+            ))
+
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, wait=True, timeout=2.0):
+        self.stop_event.set()
+        if wait:
+            for thread in self.threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout)
+        self.threads = []
+
+    def _put(self, out_queue, item):
+        # Block while the next stage is busy, but wake up regularly to notice a stop request
+        while not self.stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, in_queue):
+        while not self.stop_event.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _finish(self):
+        self.stop_event.set()
+        with self._exit_lock:
+            if self._exited:
+                return
+            self._exited = True
+        if self.on_exit:
+            self.on_exit()
+
+    def _run_source(self, out_queue):
+        try:
+            for item in self.source:
+                if not self._put(out_queue, item):
+                    break
+        except Exception as e:
+            print(f"❌ {self.name} source error: {e}")
+        finally:
+            close = getattr(self.source, "close", None)
+            if close:
+                close()
+            self._finish()
+
+    def _run_stage(self, stage, in_queue, out_queue):
+        try:
+            while not self.stop_event.is_set():
+                item = self._get(in_queue)
+                if item is None:
+                    break
+                result = stage(item)
+                if result is None:
+                    continue
+                if out_queue is None:
+                    self.sink(result)
+                elif not self._put(out_queue, result):
+                    break
+        except Exception as e:
+            print(f"❌ {self.name} stage error: {e}")
+        finally:
+            self._finish()
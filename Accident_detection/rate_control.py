@@ -0,0 +1,82 @@
+import time
+
+# Output levels from best to cheapest: (max FPS, JPEG quality, downscale factor).
+# Level 0 is the frame exactly as the encode stage produced it.
+QUALITY_LEVELS = [
+    (30, 95, 1.0),
+    (20, 75, 0.75),
+    (15, 65, 0.5),
+    (10, 55, 0.5),
+    (5, 45, 0.35),
+]
+
+
+class RateController:
+    """Adapts one subscriber's frame rate, JPEG quality and resolution to a latency budget.
+
+    Call `should_send()` before sending a frame and `record(latency)` once the send has
+    finished, with the time from the frame being published to the send completing.
+    Latency over budget steps the stream down a level; a sustained run well under
+    budget steps it back up.
+    """
+
+    def __init__(self, target_latency=0.15, levels=QUALITY_LEVELS, smoothing=0.2,
+                 upgrade_after=30, cooldown=1.0):
+        self.target_latency = target_latency
+        self.levels = levels
+        self.smoothing = smoothing
+        self.upgrade_after = upgrade_after
+        self.cooldown = cooldown
+
+        self.level = 0
+        self.latency = 0.0  # Exponentially weighted moving average, in seconds
+        self.good_streak = 0
+        self.last_sent = 0.0
+        self.last_change = 0.0
+
+    @property
+    def fps(self):
+        return self.levels[self.level][0]
+
+    @property
+    def quality(self):
+        return self.levels[self.level][1]
+
+    @property
+    def scale(self):
+        return self.levels[self.level][2]
+
+    def should_send(self, now=None):
+        now = time.monotonic() if now is None else now
+        # Allow some jitter so a stream at the source rate isn't thinned by timing noise
+        if now - self.last_sent < 0.8 / self.fps:
+            return False
+        self.last_sent = now
+        return True
+
+    def record(self, latency, now=None):
+        now = time.monotonic() if now is None else now
+        if self.latency == 0.0:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        # Give the client time to drain after each change before judging it again
+        if now - self.last_change < self.cooldown:
+            return
+
+        if self.latency > self.target_latency:
+            self.good_streak = 0
+            if self.level < len(self.levels) - 1:
+                self._set_level(self.level + 1, now)
+        elif self.latency < self.target_latency / 2:
+            self.good_streak += 1
+            if self.good_streak >= self.upgrade_after and self.level > 0:
+                self._set_level(self.level - 1, now)
+        else:
+            self.good_streak = 0
+
+    def _set_level(self, level, now):
+        self.level = level
+        self.good_streak = 0
+        self.last_change = now
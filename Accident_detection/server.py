@@ -1,11 +1,23 @@
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from ultralytics import YOLO
 import datetime
 import cv2
 import random
 import base64
 import asyncio
+import json
+import math
+import struct
+import time
+import os
+import threading
+from pipeline import StagePipeline
+from batch_inference import BatchInferenceEngine
+from rate_control import RateController, QUALITY_LEVELS
+from motion_gate import MotionGate
+from frame_reader import FrameReader
+from backends import load_model_from_env
+from accident_confirmation import confirmer_from_env
 
 app = FastAPI()
 
@@ -18,10 +30,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load YOLOv8 model
-model = YOLO("runs/detect/train20/weights/best.pt")
+# Load YOLOv8 model (NETRA_BACKEND=torch|onnx|openvino picks the inference runtime)
+model = load_model_from_env("runs/detect/train20/weights/best.pt")
 video_path = "videos/accident_trim.mp4"
 
+# Camera sources served by this process, as "name=path" pairs separated by commas,
+# e.g. NETRA_VIDEO_SOURCES="junction-1=videos/a.mp4,junction-2=rtsp://10.0.0.5/stream"
+video_sources = {"default": video_path}
+if os.environ.get("NETRA_VIDEO_SOURCES"):
+    video_sources = dict(
+        entry.split("=", 1) for entry in os.environ["NETRA_VIDEO_SOURCES"].split(",") if "=" in entry
+    )
+default_source = next(iter(video_sources))
+
+# Motion gating: skip inference on static frames, but never more than NETRA_MAX_SKIP in a row
+def new_motion_gate():
+    return MotionGate(
+        motion_threshold=float(os.environ.get("NETRA_MOTION_THRESHOLD", 0.02)),
+        max_skip=int(os.environ.get("NETRA_MAX_SKIP", 5)),
+    )
+
+# Per-subscriber latency budget used to pick frame rate and image quality
+default_latency_ms = float(os.environ.get("NETRA_TARGET_LATENCY_MS", 150))
+
+# One batched inference engine shared by every camera stream
+engine = BatchInferenceEngine(
+    model,
+    max_batch_size=int(os.environ.get("NETRA_BATCH_SIZE", 8)),
+    max_wait=float(os.environ.get("NETRA_BATCH_WAIT_MS", 20)) / 1000,
+).start()
+
 # Roorkee location data
 roorkee_locations = [
     {"name": "Cawnpore Dwar Military Contonment Roorkee India", "latitude": 29.856335, "longitude": 77.888219},
@@ -30,95 +68,383 @@ roorkee_locations = [
     {"name": "Bhagwanpur Highway, Roorkee India", "latitude": 29.939262, "longitude": 77.812466},
 ]
 
+# Wire protocols for /ws. Clients that ask for the binary subprotocol get the raw JPEG
+# in a binary message: a 4-byte big-endian header length, a JSON metadata header, then
+# the JPEG bytes. Everyone else keeps getting the original base64 JSON messages.
+JSON_PROTOCOL = "json"
+BINARY_PROTOCOL = "netra.binary.v1"
+
+class FramePacket:
+    """One annotated frame plus its detection metadata, serialized once per protocol and quality level"""
+
+    def __init__(self, frame, metadata):
+        self.frame = frame
+        self.metadata = metadata
+        self.jpegs = {}
+        self.messages = {}
+        self.published_at = 0.0
+        self.lock = threading.Lock()
+
+    def cached_message(self, protocol, level=0):
+        return self.messages.get((protocol, level))
+
+    def message(self, protocol, level=0):
+        with self.lock:
+            key = (protocol, level)
+            if key not in self.messages:
+                jpeg = self.jpeg(level)
+                if protocol == BINARY_PROTOCOL:
+                    header = json.dumps(self.metadata, separators=(",", ":")).encode("utf-8")
+                    self.messages[key] = struct.pack("!I", len(header)) + header + jpeg
+                else:
+                    b64_frame = base64.b64encode(jpeg).decode("utf-8")
+                    self.messages[key] = json.dumps({"frame": b64_frame, **self.metadata})
+            return self.messages[key]
+
+    def jpeg(self, level):
+        # Levels are encoded on demand and shared by every subscriber on that level
+        if level == 0 and level not in self.jpegs:
+            _, jpeg_frame = cv2.imencode(".jpg", self.frame)
+            self.jpegs[level] = jpeg_frame.tobytes()
+        elif level not in self.jpegs:
+            _, quality, scale = QUALITY_LEVELS[level]
+            frame = self.frame
+            if scale < 1.0:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            _, jpeg_frame = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            self.jpegs[level] = jpeg_frame.tobytes()
+        return self.jpegs[level]
+
+
+class DetectionRun:
+    """Detection state for one pipeline run; never shared with the run before or after it"""
+
+    def __init__(self):
+        self.motion_gate = new_motion_gate()
+        self.confirmer = confirmer_from_env()
+        self.consecutive_detections = 0
+        self.last_result = None
+
+
+class VideoBroadcaster:
+    """Runs one detection pipeline per video source and fans each frame out to all subscribers.
+
+    Capture, inference and JPEG encoding run on worker threads (see pipeline.py),
+    the event loop only hands finished messages to the subscribed sockets.
+    Frame subscribers (/ws) get every frame; event subscribers (/ws/events) only get
+    small JSON messages when the detection metadata or accident state changes.
+    """
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.location = random.choice(roorkee_locations)
+        self.subscribers = {}
+        self.protocol_counts = {JSON_PROTOCOL: 0, BINARY_PROTOCOL: 0}
+        self.event_subscribers = set()
+        self.last_metadata = None
+        self.pipeline = None
+
+    def subscribe(self, protocol=JSON_PROTOCOL):
+        # A single-slot queue per client: slow clients only ever see the newest frame
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers[queue] = protocol
+        self.protocol_counts[protocol] += 1
+        if self.pipeline is None:
+            self.start()
+        return queue
+
+    def subscribe_events(self):
+        # Events are tiny, so keep a short backlog rather than only the newest one
+        queue = asyncio.Queue(maxsize=32)
+        self.event_subscribers.add(queue)
+        # Only a running pipeline's state is current; an idle camera has nothing to report yet
+        if self.pipeline is not None and self.last_metadata is not None:
+            queue.put_nowait(self.event_message("snapshot", self.last_metadata))
+        if self.pipeline is None:
+            self.start()
+        return queue
+
+    def unsubscribe(self, queue):
+        protocol = self.subscribers.pop(queue, None)
+        if protocol is not None:
+            self.protocol_counts[protocol] -= 1
+        self.event_subscribers.discard(queue)
+        if not self.subscribers and not self.event_subscribers and self.pipeline is not None:
+            self.stop()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self.last_metadata = None
+        # A stopped pipeline's threads may still be finishing a frame, so each run gets its own state
+        run = DetectionRun()
+
+        def call_in_loop(callback, *args):
+            try:
+                loop.call_soon_threadsafe(callback, *args)
+            except RuntimeError:
+                pass  # Event loop already closed during shutdown
+
+        def deliver(packet):
+            if pipeline is self.pipeline:  # Drop late frames from a pipeline that was stopped
+                self.publish(packet)
+
+        def sink(packet):
+            call_in_loop(deliver, packet)
+
+        def on_exit():
+            engine.unregister_stream()
+            call_in_loop(self.on_pipeline_exit, pipeline)
+
+        pipeline = StagePipeline(
+            source=self.read_frames(),
+            stages=[lambda frame: self.detect(run, frame), self.encode],
+            sink=sink,
+            on_exit=on_exit,
+            name=f"stream-{self.name}",
+        )
+        self.pipeline = pipeline
+        engine.register_stream()  # Undone by on_exit, which the pipeline calls exactly once
+        pipeline.start()
+        print(f"🎥 Started stream {self.name} ({self.source})")
+
+    def stop(self):
+        # Don't join worker threads here, that would block the event loop
+        self.pipeline.stop(wait=False)
+        self.pipeline = None
+        self.last_metadata = None
+        print(f"🛑 Stopped stream {self.name}")
+
+    def on_pipeline_exit(self, pipeline):
+        if pipeline is not self.pipeline:
+            return  # An old pipeline finishing after a restart
+        self.pipeline = None
+        self.last_metadata = None
+        self.publish(None)
+
+    def publish(self, packet):
+        if packet is not None:
+            packet.published_at = time.monotonic()
+            self.publish_events(packet.metadata)
+        else:
+            self.put_all(self.event_subscribers, None)
+        self.put_all(self.subscribers, packet)
+
+    def publish_events(self, metadata):
+        previous = self.last_metadata
+        self.last_metadata = metadata
+        if not self.event_subscribers:
+            return
+
+        if previous is None or previous["accident_state"] != metadata["accident_state"]:
+            self.put_all(self.event_subscribers, self.event_message("state_change", metadata))
+        if previous is None or previous["detections"] != metadata["detections"]:
+            self.put_all(self.event_subscribers, self.event_message("detection", metadata))
+
+    def event_message(self, event_type, metadata):
+        return json.dumps({"type": event_type, "source": self.name, **metadata})
+
+    def put_all(self, queues, message):
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()  # Drop the oldest message instead of stalling the producer
+            queue.put_nowait(message)
+
+    def read_frames(self):
+        reader = FrameReader(self.source, loop=True)
+        if not reader.isOpened():
+            print(f"❌ Error opening video file {self.source}")
+            return
+
+        # Pace reads to the source frame rate, accounting for time already spent downstream
+        frame_interval = 1 / (reader.fps or 30)
+        next_frame_time = time.monotonic()
+
+        try:
+            while True:
+                delay = next_frame_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                    next_frame_time += frame_interval
+                else:
+                    # Fell behind (slow inference): don't try to catch up with a burst
+                    next_frame_time = time.monotonic() + frame_interval
+
+                ret, frame = reader.read()
+                if not ret:
+                    print(f"❌ Video stream ended ({self.source})")
+                    break
+
+                # The reader reuses its buffers, and this frame outlives the next read()
+                yield frame.copy()
+        finally:
+            reader.release()
+
+    def detect(self, run, frame):
+        start_time = datetime.datetime.now()
+
+        # Only run the model on motion, every Nth frame, or while something is detected;
+        # in between, the last result's boxes are drawn on the new frame
+        force = run.last_result is None or len(run.last_result.boxes) > 0
+        if run.motion_gate.should_infer(frame, force=force):
+            run.last_result = engine.infer(frame)
+        result = run.last_result
+        annotated_frame = result.plot(img=frame)
+
+        end_time = datetime.datetime.now()
+        inference_time = (end_time - start_time).total_seconds()
+        fps = round(1 / inference_time, 2) if inference_time > 0 else 0.0
+
+        # Top-left: FPS
+        cv2.putText(
+            annotated_frame,
+            f"FPS: {fps}",
+            (10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.8,
+            (0, 255, 0),
+            2,
+            cv2.LINE_AA
+        )
+
+        # Top-right: Timestamp
+        timestamp_str = end_time.strftime("%Y-%m-%d %H:%M:%S")
+        text_size, _ = cv2.getTextSize(timestamp_str, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
+        text_x = annotated_frame.shape[1] - text_size[0] - 10
+        cv2.putText(
+            annotated_frame,
+            timestamp_str,
+            (text_x, 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.8,
+            (255, 255, 255),
+            2,
+            cv2.LINE_AA
+        )
+
+        if len(result.boxes) > 0:
+            run.consecutive_detections += 1
+            print(f"⚠️ Accident detected ({run.consecutive_detections} consecutive frames)")
+        else:
+            run.consecutive_detections = 0
+
+        # accident_state comes from tracked, confirmed detections so one missed frame
+        # doesn't drop it and flicker doesn't raise it again for the same accident
+        for track in run.confirmer.update_from_result(result):
+            print(f"🚨 Accident confirmed on {self.name} (track #{track.id}, conf {track.mean_confidence:.2f})")
+        accident_state = run.confirmer.accident_state
+
+        metadata = {
+            "detections": len(result.boxes),
+            "consecutive_detections": run.consecutive_detections,
+            "accident_state": accident_state,
+            "latitude": self.location["latitude"],
+            "longitude": self.location["longitude"],
+            "address": self.location["name"],
+            "timestamp": end_time.isoformat()
+        }
+        return annotated_frame, metadata
+
+    def encode(self, item):
+        annotated_frame, metadata = item
+
+        packet = FramePacket(annotated_frame, metadata)
+
+        # Serialize here, once per protocol in use, so the event loop only sends.
+        # With only event subscribers attached no JPEG is encoded at all.
+        for protocol, count in list(self.protocol_counts.items()):
+            if count > 0:
+                packet.message(protocol)
+        return packet
+
+
+broadcasters = {}
+
+def get_broadcaster(name):
+    if name not in broadcasters:
+        broadcasters[name] = VideoBroadcaster(name, video_sources[name])
+    return broadcasters[name]
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    print("🔗 WebSocket connection established")
+    source = websocket.query_params.get("source", default_source)
+    if source not in video_sources:
+        await websocket.close(code=1008)
+        print(f"❌ Unknown video source requested: {source}")
+        return
 
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print("❌ Error opening video file")
+    # Clients may ask for their own latency budget with ?latency_ms=
+    try:
+        latency_ms = float(websocket.query_params.get("latency_ms", default_latency_ms))
+    except ValueError:
+        latency_ms = None
+    if latency_ms is None or not math.isfinite(latency_ms) or latency_ms <= 0:
+        await websocket.close(code=1008)
+        print(f"❌ Invalid latency budget requested: {websocket.query_params.get('latency_ms')}")
         return
 
-    consecutive_detections = 0
-    location = random.choice(roorkee_locations)
-    
-    while True:
-        try:
-            await asyncio.sleep(1/30)
+    # Negotiate the frame format: old clients don't offer a subprotocol and keep getting JSON
+    if BINARY_PROTOCOL in websocket.scope.get("subprotocols", []):
+        protocol = BINARY_PROTOCOL
+        await websocket.accept(subprotocol=BINARY_PROTOCOL)
+    else:
+        protocol = JSON_PROTOCOL
+        await websocket.accept()
+    print(f"🔗 WebSocket connection established ({source}, {protocol})")
+
+    broadcaster = get_broadcaster(source)
+    queue = broadcaster.subscribe(protocol)
+    rate = RateController(target_latency=latency_ms / 1000)
 
-            ret, frame = cap.read()
-            if not ret:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    try:
+        while True:
+            packet = await queue.get()
+            if packet is None:
+                break
+            if not rate.should_send():
                 continue
 
-            start_time = datetime.datetime.now()
-
-            results = model(frame)
-            annotated_frame = results[0].plot()
-
-            end_time = datetime.datetime.now()
-            inference_time = (end_time - start_time).total_seconds()
-            fps = round(1 / inference_time, 2) if inference_time > 0 else 0.0
-
-            # Top-left: FPS
-            cv2.putText(
-                annotated_frame,
-                f"FPS: {fps}",
-                (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (0, 255, 0),
-                2,
-                cv2.LINE_AA
-            )
-
-            # Top-right: Timestamp
-            timestamp_str = end_time.strftime("%Y-%m-%d %H:%M:%S")
-            text_size, _ = cv2.getTextSize(timestamp_str, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
-            text_x = annotated_frame.shape[1] - text_size[0] - 10
-            cv2.putText(
-                annotated_frame,
-                timestamp_str,
-                (text_x, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (255, 255, 255),
-                2,
-                cv2.LINE_AA
-            )
-
-            _, jpeg_frame = cv2.imencode(".jpg", annotated_frame)
-            b64_frame = base64.b64encode(jpeg_frame).decode("utf-8")
-
-            # Ensure a default location is always available
-           
-
-            if len(results[0].boxes) > 0:
-                consecutive_detections += 1
-                print(f"⚠️ Accident detected ({consecutive_detections} consecutive frames)")
-
-                accident_state = consecutive_detections >= 5
+            message = packet.cached_message(protocol, rate.level)
+            if message is None:
+                message = await asyncio.to_thread(packet.message, protocol, rate.level)
+
+            if protocol == BINARY_PROTOCOL:
+                await websocket.send_bytes(message)
             else:
-                consecutive_detections = 0
-                accident_state = False
-
-            response = {
-                "frame": b64_frame,
-                "detections": len(results[0].boxes),
-                "consecutive_detections": consecutive_detections,
-                "accident_state": accident_state,
-                "latitude": location["latitude"],
-                "longitude": location["longitude"],
-                "address": location["name"],
-                "timestamp": end_time.isoformat()
-            }
-
-            await websocket.send_json(response)
-
-        except Exception as e:
-            print(f"WebSocket error: {e}")
-            break
-
-    cap.release()
+                await websocket.send_text(message)
+
+            rate.record(time.monotonic() - packet.published_at)
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        broadcaster.unsubscribe(queue)
+
     print("🛑 WebSocket connection closed")
+
+@app.websocket("/ws/events")
+async def events_endpoint(websocket: WebSocket):
+    """Detection metadata and accident state changes only, without video frames"""
+    source = websocket.query_params.get("source", default_source)
+    if source not in video_sources:
+        await websocket.close(code=1008)
+        print(f"❌ Unknown video source requested: {source}")
+        return
+
+    await websocket.accept()
+    print(f"🔗 Event subscriber connected ({source})")
+
+    broadcaster = get_broadcaster(source)
+    queue = broadcaster.subscribe_events()
+
+    try:
+        while True:
+            message = await queue.get()
+            if message is None:
+                break
+            await websocket.send_text(message)
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        broadcaster.unsubscribe(queue)
+
+    print("🛑 Event subscriber disconnected")
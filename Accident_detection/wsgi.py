@@ -0,0 +1,10 @@
+"""Production entry point for the alert server.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+All alert state lives in the SQLite store, so any number of workers can serve it; SSE
+streams in one worker pick up alerts received by another on their next store poll.
+"""
+from app import app
+
+application = app
@@ -107,7 +107,12 @@ const App: React.FC = () => {
           const sessionData = sessionDocSnap.data();
           console.log("Live Lane Data:", sessionData);
           setStateData([{ id: latestSession.id, ...sessionData }]);
-          const laneData = sessionData.timesteps[sessionData.timesteps.length - 1].lanes;
+          // Timesteps live in the session's `timesteps` subcollection; the session document
+          // keeps the newest one. Older sessions still have the full `timesteps` array.
+          const latestTimestep = sessionData.latest_timestep
+            ?? sessionData.timesteps?.[sessionData.timesteps.length - 1];
+          const laneData = latestTimestep?.lanes;
+          if (!laneData) return;
 
           // calculating vehicle density
           if (laneData) {
@@ -9,22 +9,41 @@ const YoloStream = ({ setData }: YoloStreamProps) => {
     const imgRef = useRef<HTMLImageElement>(null);
 
     useEffect(() => {
-        const socket = new WebSocket('ws://localhost:8000/ws');
+        // Ask for binary frames instead of base64 JSON (text messages are still handled below)
+        const socket = new WebSocket('ws://localhost:8000/ws', ['netra.binary.v1']);
+        socket.binaryType = 'arraybuffer';
+        let frameUrl: string | null = null;
 
 
         socket.onopen = () =>{
-            console.log("Socket Connection Oppened")
+            console.log("Socket Connection Oppened", socket.protocol || "json")
         }
 
         socket.onmessage = (event) => {
-            const data = JSON.parse(event.data);
-            setData(data)
-            if (imgRef.current) {
+            if (typeof event.data === 'string') {
+                const data = JSON.parse(event.data);
+                setData(data)
                 if (imgRef.current) {
                     imgRef.current.src = `data:image/jpeg;base64,${data.frame}`;
                 }
+                console.log("Data recieved on local Instance", data)
+                return;
+            }
 
+            // Binary frame: 4-byte header length, JSON metadata header, then the JPEG bytes
+            const buffer = event.data as ArrayBuffer;
+            const headerLength = new DataView(buffer).getUint32(0);
+            const header = new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength));
+            const data: AccidentData = JSON.parse(header);
+            setData(data)
 
+            if (imgRef.current) {
+                const jpeg = new Blob([new Uint8Array(buffer, 4 + headerLength)], { type: 'image/jpeg' });
+                if (frameUrl) {
+                    URL.revokeObjectURL(frameUrl);
+                }
+                frameUrl = URL.createObjectURL(jpeg);
+                imgRef.current.src = frameUrl;
             }
             console.log("Data recieved on local Instance", data)
         };
@@ -33,7 +52,12 @@ const YoloStream = ({ setData }: YoloStreamProps) => {
             console.error('WebSocket error:', err);
         };
 
-        return () => socket.close();
+        return () => {
+            socket.close();
+            if (frameUrl) {
+                URL.revokeObjectURL(frameUrl);
+            }
+        };
     }, []);
 
     return (
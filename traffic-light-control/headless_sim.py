@@ -0,0 +1,128 @@
+"""Run the intersection controller without the UI, as fast as the CPU allows.
+
+    python headless_sim.py --north north_lane.csv --south south_lane.csv \
+        --east east_lane.csv --west west_lane.csv --duration-min 1440 --output results.csv
+
+Writes every lane's timesteps to a CSV, a JSON summary next to it and, with --report,
+the same queue plots the UI produces. --telemetry streams the controller's timesteps to a
+JSONL file in chunks, the same way the UI streams them to Firestore.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from intersection import IntersectionController, run_simulation
+from telemetry import TimestepWriter, JsonlSink
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless 4-way intersection traffic light simulation")
+    for lane in ('north', 'south', 'east', 'west'):
+        parser.add_argument(f"--{lane}", metavar="CSV", help=f"Arrivals for the {lane} lane")
+    parser.add_argument("--duration-min", type=float, default=15, help="Simulated time in minutes")
+    parser.add_argument("--step-sec", type=float, default=6, help="Simulation time step in seconds")
+    parser.add_argument("--green-sec", type=float, default=60, help="Base green duration")
+    parser.add_argument("--yellow-sec", type=float, default=12)
+    parser.add_argument("--all-red-sec", type=float, default=6)
+    parser.add_argument("--min-green-sec", type=float, default=30)
+    parser.add_argument("--max-green-sec", type=float, default=120)
+    parser.add_argument("--passing-rate", type=float, default=15, help="Vehicles per minute on green")
+    parser.add_argument("--queue-threshold", type=int, default=35, help="Queue that extends or ends a green")
+    parser.add_argument("--output", default="simulation_results.csv", help="Per-timestep CSV for all lanes")
+    parser.add_argument("--summary", help="JSON summary path (default: next to --output)")
+    parser.add_argument("--report", metavar="PNG", help="Also draw the queue plots to this image")
+    parser.add_argument("--telemetry", metavar="JSONL", help="Stream timestep chunks to this file")
+    parser.add_argument("--telemetry-chunk", type=int, default=50, help="Timesteps per telemetry chunk")
+    return parser.parse_args()
+
+
+def build_controller(args, telemetry=None):
+    controller = IntersectionController(telemetry=telemetry)
+    controller.base_green_duration = args.green_sec
+    controller.green_duration = args.green_sec
+    controller.yellow_duration = args.yellow_sec
+    controller.all_red_duration = args.all_red_sec
+    controller.min_green_duration = args.min_green_sec
+    controller.max_green_duration = args.max_green_sec
+    controller.passing_rate = args.passing_rate / 60  # veh/min to veh/sec
+    controller.queue_threshold = args.queue_threshold
+
+    for name, lane in controller.lanes.items():
+        csv_file = getattr(args, name)
+        if csv_file:
+            lane.load_data(csv_file)
+        else:
+            print(f"⚠️ No file for {name} lane, using empty data")
+    return controller
+
+
+def summarize(controller, steps, elapsed, args):
+    history = controller.history_frame()
+    lanes = {}
+    for name, lane_history in history.groupby('lane', sort=False):
+        lanes[name] = {
+            'arrivals': int(lane_history['arrivals'].sum()),
+            'departures': int(lane_history['departures'].sum()),
+            'max_queue': int(lane_history['queue'].max()),
+            'mean_queue': round(float(lane_history['queue'].mean()), 2),
+            'final_queue': int(lane_history['queue'].iloc[-1]),
+            'green_share': round(float((lane_history['state'] == 'GREEN').mean()), 3),
+        }
+    return {
+        'simulated_seconds': args.duration_min * 60,
+        'time_step': args.step_sec,
+        'steps': steps,
+        'wall_seconds': round(elapsed, 3),
+        'steps_per_second': round(steps / elapsed, 1) if elapsed else None,
+        'lanes': lanes,
+    }
+
+
+def main():
+    args = parse_args()
+    telemetry = None
+    if args.telemetry:
+        telemetry = TimestepWriter(JsonlSink(args.telemetry), chunk_size=args.telemetry_chunk)
+    try:
+        controller = build_controller(args, telemetry)
+    except ValueError as e:
+        print(f"❌ {e}")
+        if telemetry:
+            telemetry.close()
+        sys.exit(1)
+
+    steps = 0
+
+    def count_step(controller, sim_time):
+        nonlocal steps
+        steps += 1
+
+    print(f"🚦 Simulating {args.duration_min:g} min in {args.step_sec:g} s steps...")
+    start = time.perf_counter()
+    run_simulation(controller, args.duration_min * 60, args.step_sec, on_step=count_step)
+    elapsed = time.perf_counter() - start
+    if telemetry:
+        telemetry.close()
+
+    controller.history_frame().to_csv(args.output, index=False)
+    summary = summarize(controller, steps, elapsed, args)
+    summary_path = args.summary or os.path.splitext(args.output)[0] + ".json"
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"✅ {steps} steps in {elapsed:.2f} s ({summary['steps_per_second']} steps/s)")
+    for name, stats in summary['lanes'].items():
+        print(f"   {name:<6} arrivals {stats['arrivals']:>6}  departures {stats['departures']:>6}  "
+              f"max queue {stats['max_queue']:>4}  final queue {stats['final_queue']:>4}")
+    print(f"💾 Results: {args.output}, summary: {summary_path}")
+    if telemetry:
+        print(f"📡 Telemetry: {args.telemetry}")
+
+    if args.report:
+        controller.generate_report(args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""Traffic light control core: lanes, light states and the adaptive intersection controller.
+
+Nothing here needs Tk, a serial port or Firebase, so the controller can be stepped by the
+UI in simulate_traffic_lights.py or headless by headless_sim.py. Timesteps are logged
+through an optional telemetry writer (see telemetry.py), and matplotlib is only imported
+when a report is drawn.
+"""
+from datetime import datetime, timezone
+from enum import Enum
+
+import numpy as np
+import pandas as pd
+
+class LightState(Enum):
+    GREEN = 1
+    YELLOW = 2
+    RED = 3
+
+STATE_COLORS = {'GREEN': 'lightgreen', 'YELLOW': 'yellow', 'RED': 'lightcoral'}
+
+
+class LaneHistory:
+    """Per-step lane records stored as numpy columns instead of one dict per step.
+
+    Columns are preallocated and doubled when full, so appending is amortized O(1) and a
+    step costs ~50 bytes. `to_frame()` wraps the filled part of the columns in a DataFrame
+    without copying them, and `state` is kept as LightState values (see `state_names()`).
+    """
+
+    COLUMNS = {
+        'time': np.float64,
+        'state': np.int8,
+        'state_duration': np.float64,
+        'time_remaining': np.float64,
+        'queue': np.int32,
+        'arrivals': np.int32,
+        'departures': np.int32,
+        'car': np.int32,
+        'bus': np.int32,
+        'truck': np.int32,
+    }
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in self.COLUMNS.items()}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.columns[name][:self.size]
+
+    def append(self, time, state, state_duration, time_remaining, queue, arrivals, departures, car, bus, truck):
+        if self.size == len(self.columns['time']):
+            for name, column in self.columns.items():
+                grown = np.zeros(2 * len(column), column.dtype)
+                grown[:self.size] = column
+                self.columns[name] = grown
+        i = self.size
+        values = (time, state.value, state_duration, time_remaining, queue, arrivals, departures, car, bus, truck)
+        for column, value in zip(self.columns.values(), values):
+            column[i] = value
+        self.size += 1
+
+    def state_names(self):
+        return pd.Categorical.from_codes(self['state'] - 1, categories=[s.name for s in LightState])
+
+    def state_spans(self):
+        """(start time, end time, state name) for each run of the same light state"""
+        if not self.size:
+            return []
+        states, times = self['state'], self['time']
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(states)) + 1))
+        ends = np.append(times[starts[1:]], times[-1])
+        return [(times[s], end, LightState(states[s]).name) for s, end in zip(starts, ends)]
+
+    def to_frame(self):
+        df = pd.DataFrame({name: self[name] for name in self.COLUMNS}, copy=False)
+        df['state'] = self.state_names()
+        return df
+
+
+class Lane:
+    def __init__(self, name, csv_file=None):
+        self.name = name
+        self.csv_file = csv_file
+        self.data = None
+        self.vehicle_queue = {'car': 0, 'bus': 0, 'truck': 0}
+        self.history = LaneHistory()
+        self.current_state = LightState.RED
+        self.state_start_time = 0
+        self.state_duration = 0  # Track how long in current state (in seconds)
+        self.time_remaining = 0  # Time until next state change (in seconds)
+        self.vehicles_passed = 0
+        self.last_processed_time = 0  # in seconds
+        # Arrival times sorted ascending, with running totals per column (prefixed by 0)
+        self.arrival_times = None
+        self.arrival_totals = {}
+
+    def load_data(self, csv_file=None):
+        """Load arrivals from the lane's CSV; returns False if there is no file to load.
+
+        Raises ValueError (or the pandas/OS error) if the file can't be used, so the UI or
+        CLI can report it however suits it.
+        """
+        if csv_file:
+            self.csv_file = csv_file
+        if not self.csv_file:
+            return False
+        try:
+            self.data = pd.read_csv(self.csv_file)
+        except Exception as e:
+            raise ValueError(f"Error loading {self.name} data: {e}") from e
+
+        if 'Timestamp (s)' not in self.data.columns:
+            if 'Timestamp (min)' in self.data.columns:
+                self.data['Timestamp (s)'] = self.data['Timestamp (min)'] * 60
+            else:
+                raise ValueError(f"{self.name} CSV must contain either 'Timestamp (min)' or 'Timestamp (s)' column")
+
+        required_cols = ['Car', 'Bus', 'Truck', 'Total']
+        for col in required_cols:
+            if col not in self.data.columns:
+                raise ValueError(f"{self.name} CSV must contain '{col}' column")
+
+        # Index the arrivals once so every step is two binary searches instead of a scan
+        data = self.data.sort_values('Timestamp (s)', kind='stable')
+        self.arrival_times = data['Timestamp (s)'].to_numpy(dtype=float)
+        self.arrival_totals = {
+            col: np.concatenate(([0], data[col].fillna(0).to_numpy().cumsum()))
+            for col in required_cols
+        }
+        return True
+
+    def add_vehicles(self, timestamp):
+        if self.arrival_times is None:
+            return 0
+
+        # Only process new arrivals since last processed time: rows in (start, end]
+        start = np.searchsorted(self.arrival_times, self.last_processed_time, side='right')
+        end = np.searchsorted(self.arrival_times, timestamp, side='right')
+
+        if end > start:
+            # Plain ints, so queue sizes and timings derived from them stay JSON/Firestore serializable
+            totals = self.arrival_totals
+            self.vehicle_queue['car'] += int(totals['Car'][end] - totals['Car'][start])
+            self.vehicle_queue['bus'] += int(totals['Bus'][end] - totals['Bus'][start])
+            self.vehicle_queue['truck'] += int(totals['Truck'][end] - totals['Truck'][start])
+
+            self.last_processed_time = timestamp
+            return int(totals['Total'][end] - totals['Total'][start])
+        return 0
+
+    def process_green_light(self, current_time, passing_rate):
+        time_in_state = current_time - self.state_start_time
+        total_vehicles = sum(self.vehicle_queue.values())
+
+        if total_vehicles == 0:
+            return 0
+
+        # Calculate how many vehicles can pass based on time in green state
+        vehicles_able_to_pass = min(
+            int(passing_rate * time_in_state),
+            total_vehicles
+        )
+
+        # Calculate proportions for each vehicle type
+        if total_vehicles > 0:
+            car_pct = self.vehicle_queue['car'] / total_vehicles
+            bus_pct = self.vehicle_queue['bus'] / total_vehicles
+            truck_pct = self.vehicle_queue['truck'] / total_vehicles
+        else:
+            car_pct = bus_pct = truck_pct = 0
+
+        # Calculate vehicles to pass for each type
+        cars_passed = min(int(vehicles_able_to_pass * car_pct), self.vehicle_queue['car'])
+        buses_passed = min(int(vehicles_able_to_pass * bus_pct), self.vehicle_queue['bus'])
+        trucks_passed = min(int(vehicles_able_to_pass * truck_pct), self.vehicle_queue['truck'])
+
+        # Distribute any remaining vehicles due to rounding
+        remaining = vehicles_able_to_pass - (cars_passed + buses_passed + trucks_passed)
+        while remaining > 0 and total_vehicles > 0:
+            if self.vehicle_queue['car'] > cars_passed:
+                cars_passed += 1
+            elif self.vehicle_queue['bus'] > buses_passed:
+                buses_passed += 1
+            elif self.vehicle_queue['truck'] > trucks_passed:
+                trucks_passed += 1
+            else:
+                break
+            remaining -= 1
+
+        # Update queues
+        self.vehicle_queue['car'] = max(0, self.vehicle_queue['car'] - cars_passed)
+        self.vehicle_queue['bus'] = max(0, self.vehicle_queue['bus'] - buses_passed)
+        self.vehicle_queue['truck'] = max(0, self.vehicle_queue['truck'] - trucks_passed)
+
+        self.vehicles_passed = cars_passed + buses_passed + trucks_passed
+        return self.vehicles_passed
+
+class IntersectionController:
+    def __init__(self, telemetry=None):
+        # Optional telemetry.TimestepWriter that receives every timestep and phase change
+        self.telemetry = telemetry
+
+        # Configuration (in seconds)
+        self.base_green_duration = 60.0  # 60 seconds = 1 min
+        self.yellow_duration = 12.0  # 12 seconds
+        self.all_red_duration = 6.0  # 6 seconds
+        self.phase_transition_buffer = 3.0  # 3 seconds buffer
+        self.passing_rate = 0.25  # vehicles per second (15 veh/min = 0.25 veh/sec)
+
+        # Threshold for dynamic adjustment
+        self.queue_threshold = 35  # vehicles
+
+        # Minimum and maximum green durations
+        self.min_green_duration = 30.0  # 30 seconds minimum
+        self.max_green_duration = 120.0  # 120 seconds maximum
+
+        # Create lanes
+        self.lanes = {
+            'north': Lane('North'),
+            'south': Lane('South'),
+            'east': Lane('East'),
+            'west': Lane('West')
+        }
+
+        # Phases (opposite directions go together)
+        self.phases = [
+            ['north', 'south'],  # Phase 1: North-South green
+            ['east', 'west']     # Phase 2: East-West green
+        ]
+        self.current_phase = 0
+        self.cycle_start_time = 0
+        self.green_duration = self.base_green_duration
+        self.in_yellow = False
+        self.in_all_red = False
+        self.phase_transition_start = 0
+
+    def load_all_data(self):
+        return all(lane.load_data() for lane in self.lanes.values() if lane.csv_file)
+
+    def set_phase(self, phase_index, current_time):
+        """Set a new phase with proper state transitions"""
+        # If we're not in transition, start yellow phase
+        if not self.in_yellow and not self.in_all_red:
+            self.in_yellow = True
+            self.phase_transition_start = current_time
+            for name in self.phases[self.current_phase]:
+                self.lanes[name].current_state = LightState.YELLOW
+                self.lanes[name].state_start_time = current_time
+                self.lanes[name].time_remaining = self.yellow_duration
+            return
+
+        # If we're in yellow, transition to all-red
+        if self.in_yellow and not self.in_all_red:
+            self.in_yellow = False
+            self.in_all_red = True
+            self.phase_transition_start = current_time
+            for name in self.lanes:
+                self.lanes[name].current_state = LightState.RED
+                self.lanes[name].state_start_time = current_time
+                self.lanes[name].time_remaining = self.all_red_duration
+            return
+
+        # After all-red, switch to new phase
+        self.in_yellow = False
+        self.in_all_red = False
+        self.current_phase = phase_index
+        self.cycle_start_time = current_time
+
+        # Set states for all lanes
+        for name, lane in self.lanes.items():
+            if name in self.phases[phase_index]:
+                lane.current_state = LightState.GREEN
+                lane.time_remaining = self.green_duration
+            else:
+                lane.current_state = LightState.RED
+                # Calculate time until next green for this lane
+                lane.time_remaining = self.green_duration + self.yellow_duration + self.all_red_duration
+            lane.state_start_time = current_time
+
+        # Record the phase change on the session (written with the next telemetry flush)
+        if self.telemetry:
+            self.telemetry.update_session({
+                'current_phase': phase_index,
+                **{
+                    f'lanes.{name}.time_remaining': lane.time_remaining
+                    for name, lane in self.lanes.items()
+                }
+            })
+
+    def update_intersection(self, current_time):
+        # Update all lanes with their individual timings
+        # The per-lane dicts are only built for telemetry; history is kept in columns
+        logging = self.telemetry is not None
+        if logging:
+            timestep_data = {
+                'time': current_time,
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'current_phase': self.current_phase,
+                'lanes': {}
+            }
+
+        for name, lane in self.lanes.items():
+            # Update state duration and time remaining
+            lane.state_duration = current_time - lane.state_start_time
+
+            # Calculate time remaining based on current state
+            if lane.current_state == LightState.GREEN:
+                lane.time_remaining = max(0, self.green_duration - lane.state_duration)
+            elif lane.current_state == LightState.YELLOW:
+                lane.time_remaining = max(0, self.yellow_duration - lane.state_duration)
+            else:  # RED
+                # For red lights, calculate time until next green
+                if name in self.phases[self.current_phase]:
+                    # In active phase but currently red (during yellow/all-red transition)
+                    if self.in_all_red:
+                        lane.time_remaining = max(0, self.all_red_duration )
+                    elif self.in_yellow:
+                        lane.time_remaining = max(0, ( self.all_red_duration))
+                else:
+                    # In inactive phase - time until next green phase
+                    phase_time_remaining = self.green_duration - (current_time - self.cycle_start_time)
+                    lane.time_remaining = max(0, phase_time_remaining + self.all_red_duration)
+
+            # Add arriving vehicles
+            arrivals = lane.add_vehicles(current_time)
+
+            # Process vehicles based on light state
+            if lane.current_state == LightState.GREEN:
+                passed = lane.process_green_light(current_time, self.passing_rate)
+
+            # Record lane data with timing information
+            queue = int(sum(lane.vehicle_queue.values()))
+            lane.history.append(
+                current_time, lane.current_state, lane.state_duration, lane.time_remaining,
+                queue, arrivals, lane.vehicles_passed,
+                lane.vehicle_queue['car'], lane.vehicle_queue['bus'], lane.vehicle_queue['truck'],
+            )
+
+            if logging:
+                timestep_data['lanes'][name] = {
+                    'state': lane.current_state.name,
+                    'state_duration': lane.state_duration,
+                    'time_remaining': lane.time_remaining,
+                    'queue': queue,
+                    'arrivals': int(arrivals),
+                    'departures': int(lane.vehicles_passed),
+                    'vehicle_counts': {
+                        'car': int(lane.vehicle_queue['car']),
+                        'bus': int(lane.vehicle_queue['bus']),
+                        'truck': int(lane.vehicle_queue['truck'])
+                    }
+                }
+            lane.vehicles_passed = 0
+
+        # Buffered; the writer's thread sends it, so the simulation never waits on the network
+        if logging:
+            self.telemetry.write(timestep_data)
+            self.telemetry.update_session({'current_phase': self.current_phase})
+
+    def check_phase_change(self, current_time):
+        time_in_phase = current_time - self.cycle_start_time
+
+        # Calculate queue sizes for active lanes
+        active_lanes = [self.lanes[name] for name in self.phases[self.current_phase]]
+        max_queue = max(sum(lane.vehicle_queue.values()) for lane in active_lanes)
+
+        # Dynamic green duration calculation
+        if max_queue > self.queue_threshold:
+            # Increase green time proportionally to queue size, but within limits
+            queue_excess = max_queue - self.queue_threshold
+            self.green_duration = min(
+                self.base_green_duration + (queue_excess * 3),  # 3 sec per extra vehicle
+                self.max_green_duration
+            )
+        else:
+            # Use base duration if queue is below threshold
+            self.green_duration = self.base_green_duration
+
+        # Ensure we don't go below minimum duration
+        self.green_duration = max(self.green_duration, self.min_green_duration)
+
+        # Check if we're in transition
+        if self.in_yellow or self.in_all_red:
+            transition_time = current_time - self.phase_transition_start
+            if self.in_yellow and transition_time >= self.yellow_duration:
+                self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
+            elif self.in_all_red and transition_time >= self.all_red_duration:
+                self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
+            return
+
+        # Check if any non-active lane has queue exceeding threshold
+        for name, lane in self.lanes.items():
+            if name not in self.phases[self.current_phase] and sum(lane.vehicle_queue.values()) > self.queue_threshold:
+                # Only switch if current phase has been active for at least minimum duration
+                if time_in_phase >= self.min_green_duration:
+                    self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
+                    return
+
+        # Check if current phase should end normally
+        if time_in_phase >= self.green_duration:
+            self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
+
+    def history_frame(self):
+        """Every lane's recorded timesteps as one DataFrame, with a `lane` column"""
+        frames = []
+        for name, lane in self.lanes.items():
+            if not lane.history:
+                continue
+            df = lane.history.to_frame()
+            df.insert(0, 'lane', name)
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def generate_report(self, path="4way_intersection_simulation.png"):
+        import matplotlib.pyplot as plt
+
+        plt.figure(figsize=(15, 10))
+
+        # Plot queues for each lane
+        for i, (name, lane) in enumerate(self.lanes.items()):
+            history = lane.history
+
+            plt.subplot(2, 2, i+1)
+            plt.plot(history['time'], history['queue'], 'b-', label='Queue')
+            plt.plot(history['time'], history['arrivals'], 'g--', label='Arrivals', alpha=0.5)
+            plt.plot(history['time'], history['departures'], 'r:', label='Departures', alpha=0.5)
+
+            # Add light state background colors
+            for start, end, state in history.state_spans():
+                plt.axvspan(start, end, facecolor=STATE_COLORS[state], alpha=0.3)
+
+            plt.title(f"{name.capitalize()} Lane Traffic")
+            plt.xlabel('Time (sec)')
+            plt.ylabel('Vehicles')
+            plt.legend()
+            plt.grid(True)
+
+        plt.tight_layout()
+        plt.savefig(path)
+        plt.close()
+        print(f"\nReport generated: {path}")
+
+
+def run_simulation(controller, duration, time_step=6, on_step=None):
+    """Step the controller from 0 to `duration` seconds as fast as the CPU allows.
+
+    Follows the same sequence as the UI (initial phase, then update and phase check each
+    step). `on_step(controller, sim_time)` is called after every step.
+    """
+    controller.set_phase(0, 0)
+    sim_time = 0
+    while sim_time <= duration:
+        controller.update_intersection(sim_time)
+        controller.check_phase_change(sim_time)
+        if on_step:
+            on_step(controller, sim_time)
+        sim_time += time_step
+    return controller
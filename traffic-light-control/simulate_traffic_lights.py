@@ -1,371 +1,16 @@
 import serial
 import serial.tools.list_ports
-import datetime
-from datetime import datetime, timezone
-import pandas as pd
+import numpy as np
 import time
 import matplotlib.pyplot as plt
-from enum import Enum
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
-
-class LightState(Enum):
-    GREEN = 1
-    YELLOW = 2
-    RED = 3
-
-class Lane:
-    def __init__(self, name, csv_file=None):
-        self.name = name
-        self.csv_file = csv_file
-        self.data = None
-        self.vehicle_queue = {'car': 0, 'bus': 0, 'truck': 0}
-        self.history = []
-        self.current_state = LightState.RED
-        self.state_start_time = 0
-        self.state_duration = 0  # Track how long in current state (in seconds)
-        self.time_remaining = 0  # Time until next state change (in seconds)
-        self.vehicles_passed = 0
-        self.last_processed_time = 0  # in seconds
-
-    def load_data(self, csv_file=None):
-        if csv_file:
-            self.csv_file = csv_file
-        try:
-            if self.csv_file:
-                self.data = pd.read_csv(self.csv_file)
-                if 'Timestamp (s)' not in self.data.columns:
-                    if 'Timestamp (min)' in self.data.columns:
-                        self.data['Timestamp (s)'] = self.data['Timestamp (min)'] * 60
-                    else:
-                        raise ValueError("CSV must contain either 'Timestamp (min)' or 'Timestamp (s)' column")
-
-                required_cols = ['Car', 'Bus', 'Truck', 'Total']
-                for col in required_cols:
-                    if col not in self.data.columns:
-                        raise ValueError(f"CSV must contain '{col}' column")
-                return True
-            return False
-        except Exception as e:
-            messagebox.showerror("Error", f"Error loading {self.name} data: {e}")
-            return False
-
-    def add_vehicles(self, timestamp):
-        if self.data is None:
-            return 0
-
-        # Only process new arrivals since last processed time
-        arrivals = self.data[(self.data['Timestamp (s)'] > self.last_processed_time) &
-                           (self.data['Timestamp (s)'] <= timestamp)]
-
-        if not arrivals.empty:
-            cars = arrivals['Car'].sum()
-            buses = arrivals['Bus'].sum()
-            trucks = arrivals['Truck'].sum()
-
-            self.vehicle_queue['car'] += cars
-            self.vehicle_queue['bus'] += buses
-            self.vehicle_queue['truck'] += trucks
-
-            self.last_processed_time = timestamp
-            return arrivals['Total'].sum()
-        return 0
-
-    def process_green_light(self, current_time, passing_rate):
-        time_in_state = current_time - self.state_start_time
-        total_vehicles = sum(self.vehicle_queue.values())
-
-        if total_vehicles == 0:
-            return 0
-
-        # Calculate how many vehicles can pass based on time in green state
-        vehicles_able_to_pass = min(
-            int(passing_rate * time_in_state),
-            total_vehicles
-        )
-
-        # Calculate proportions for each vehicle type
-        if total_vehicles > 0:
-            car_pct = self.vehicle_queue['car'] / total_vehicles
-            bus_pct = self.vehicle_queue['bus'] / total_vehicles
-            truck_pct = self.vehicle_queue['truck'] / total_vehicles
-        else:
-            car_pct = bus_pct = truck_pct = 0
-
-        # Calculate vehicles to pass for each type
-        cars_passed = min(int(vehicles_able_to_pass * car_pct), self.vehicle_queue['car'])
-        buses_passed = min(int(vehicles_able_to_pass * bus_pct), self.vehicle_queue['bus'])
-        trucks_passed = min(int(vehicles_able_to_pass * truck_pct), self.vehicle_queue['truck'])
-
-        # Distribute any remaining vehicles due to rounding
-        remaining = vehicles_able_to_pass - (cars_passed + buses_passed + trucks_passed)
-        while remaining > 0 and total_vehicles > 0:
-            if self.vehicle_queue['car'] > cars_passed:
-                cars_passed += 1
-            elif self.vehicle_queue['bus'] > buses_passed:
-                buses_passed += 1
-            elif self.vehicle_queue['truck'] > trucks_passed:
-                trucks_passed += 1
-            else:
-                break
-            remaining -= 1
-
-        # Update queues
-        self.vehicle_queue['car'] = max(0, self.vehicle_queue['car'] - cars_passed)
-        self.vehicle_queue['bus'] = max(0, self.vehicle_queue['bus'] - buses_passed)
-        self.vehicle_queue['truck'] = max(0, self.vehicle_queue['truck'] - trucks_passed)
-
-        self.vehicles_passed = cars_passed + buses_passed + trucks_passed
-        return self.vehicles_passed
-
-class IntersectionController:
-    def __init__(self):
-        # Configuration (in seconds)
-        self.base_green_duration = 60.0  # 60 seconds = 1 min
-        self.yellow_duration = 12.0  # 12 seconds
-        self.all_red_duration = 6.0  # 6 seconds
-        self.phase_transition_buffer = 3.0  # 3 seconds buffer
-        self.passing_rate = 0.25  # vehicles per second (15 veh/min = 0.25 veh/sec)
-
-        # Threshold for dynamic adjustment
-        self.queue_threshold = 35  # vehicles
-
-        # Minimum and maximum green durations
-        self.min_green_duration = 30.0  # 30 seconds minimum
-        self.max_green_duration = 120.0  # 120 seconds maximum
-
-        # Create lanes
-        self.lanes = {
-            'north': Lane('North'),
-            'south': Lane('South'),
-            'east': Lane('East'),
-            'west': Lane('West')
-        }
-
-        # Phases (opposite directions go together)
-        self.phases = [
-            ['north', 'south'],  # Phase 1: North-South green
-            ['east', 'west']     # Phase 2: East-West green
-        ]
-        self.current_phase = 0
-        self.cycle_start_time = 0
-        self.green_duration = self.base_green_duration
-        self.in_yellow = False
-        self.in_all_red = False
-        self.phase_transition_start = 0
-
-    def load_all_data(self):
-        return all(lane.load_data() for lane in self.lanes.values() if lane.csv_file)
-
-    def set_phase(self, phase_index, current_time):
-        """Set a new phase with proper state transitions"""
-        # If we're not in transition, start yellow phase
-        if not self.in_yellow and not self.in_all_red:
-            self.in_yellow = True
-            self.phase_transition_start = current_time
-            for name in self.phases[self.current_phase]:
-                self.lanes[name].current_state = LightState.YELLOW
-                self.lanes[name].state_start_time = current_time
-                self.lanes[name].time_remaining = self.yellow_duration
-            return
-
-        # If we're in yellow, transition to all-red
-        if self.in_yellow and not self.in_all_red:
-            self.in_yellow = False
-            self.in_all_red = True
-            self.phase_transition_start = current_time
-            for name in self.lanes:
-                self.lanes[name].current_state = LightState.RED
-                self.lanes[name].state_start_time = current_time
-                self.lanes[name].time_remaining = self.all_red_duration
-            return
-
-        # After all-red, switch to new phase
-        self.in_yellow = False
-        self.in_all_red = False
-        self.current_phase = phase_index
-        self.cycle_start_time = current_time
-
-        # Set states for all lanes
-        for name, lane in self.lanes.items():
-            if name in self.phases[phase_index]:
-                lane.current_state = LightState.GREEN
-                lane.time_remaining = self.green_duration
-            else:
-                lane.current_state = LightState.RED
-                # Calculate time until next green for this lane
-                lane.time_remaining = self.green_duration + self.yellow_duration + self.all_red_duration
-            lane.state_start_time = current_time
-
-        # Update Firestore with phase change
-        if hasattr(self, 'session_ref') and self.session_ref:
-            try:
-                self.session_ref.update({
-                    'current_phase': phase_index,
-                    **{
-                        f'lanes.{name}.time_remaining': lane.time_remaining
-                        for name, lane in self.lanes.items()
-                    }
-                })
-            except Exception as e:
-                print(f"Error updating phase in Firestore: {e}")
-
-    def update_intersection(self, current_time, db=None, session_ref=None):
-        # Update all lanes with their individual timings
-        timestep_data = {
-            'time': current_time,
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'current_phase': self.current_phase,
-            'lanes': {}
-        }
-
-        for name, lane in self.lanes.items():
-            # Update state duration and time remaining
-            lane.state_duration = current_time - lane.state_start_time
-
-            # Calculate time remaining based on current state
-            if lane.current_state == LightState.GREEN:
-                lane.time_remaining = max(0, self.green_duration - lane.state_duration)
-            elif lane.current_state == LightState.YELLOW:
-                lane.time_remaining = max(0, self.yellow_duration - lane.state_duration)
-            else:  # RED
-                # For red lights, calculate time until next green
-                if name in self.phases[self.current_phase]:
-                    # In active phase but currently red (during yellow/all-red transition)
-                    if self.in_all_red:
-                        lane.time_remaining = max(0, self.all_red_duration )
-                    elif self.in_yellow:
-                        lane.time_remaining = max(0, ( self.all_red_duration))
-                else:
-                    # In inactive phase - time until next green phase
-                    phase_time_remaining = self.green_duration - (current_time - self.cycle_start_time)
-                    lane.time_remaining = max(0, phase_time_remaining + self.all_red_duration)
-
-            # Add arriving vehicles
-            arrivals = lane.add_vehicles(current_time)
-
-            # Process vehicles based on light state
-            if lane.current_state == LightState.GREEN:
-                passed = lane.process_green_light(current_time, self.passing_rate)
-
-            # Record lane data with timing information
-            lane_data = {
-                'state': lane.current_state.name,
-                'state_duration': lane.state_duration,
-                'time_remaining': lane.time_remaining,
-                'queue': int(sum(lane.vehicle_queue.values())),
-                'arrivals': int(arrivals),
-                'departures': int(lane.vehicles_passed),
-                'vehicle_counts': {
-                    'car': int(lane.vehicle_queue['car']),
-                    'bus': int(lane.vehicle_queue['bus']),
-                    'truck': int(lane.vehicle_queue['truck'])
-                }
-            }
-
-            lane.history.append({
-                'time': current_time,
-                **lane_data
-            })
-
-            timestep_data['lanes'][name] = lane_data
-            lane.vehicles_passed = 0
-
-        # Send data to Firestore if available
-        if db and session_ref:
-            try:
-                session_ref.update({
-                    'timesteps': firestore.ArrayUnion([timestep_data]),
-                    'current_phase': self.current_phase
-                })
-            except Exception as e:
-                print(f"Error writing to Firestore: {e}")
-
-    def check_phase_change(self, current_time):
-        time_in_phase = current_time - self.cycle_start_time
-
-        # Calculate queue sizes for active lanes
-        active_lanes = [self.lanes[name] for name in self.phases[self.current_phase]]
-        max_queue = max(sum(lane.vehicle_queue.values()) for lane in active_lanes)
-
-        # Dynamic green duration calculation
-        if max_queue > self.queue_threshold:
-            # Increase green time proportionally to queue size, but within limits
-            queue_excess = max_queue - self.queue_threshold
-            self.green_duration = min(
-                self.base_green_duration + (queue_excess * 3),  # 3 sec per extra vehicle
-                self.max_green_duration
-            )
-        else:
-            # Use base duration if queue is below threshold
-            self.green_duration = self.base_green_duration
-
-        # Ensure we don't go below minimum duration
-        self.green_duration = max(self.green_duration, self.min_green_duration)
-
-        # Check if we're in transition
-        if self.in_yellow or self.in_all_red:
-            transition_time = current_time - self.phase_transition_start
-            if self.in_yellow and transition_time >= self.yellow_duration:
-                self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
-            elif self.in_all_red and transition_time >= self.all_red_duration:
-                self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
-            return
-
-        # Check if any non-active lane has queue exceeding threshold
-        for name, lane in self.lanes.items():
-            if name not in self.phases[self.current_phase] and sum(lane.vehicle_queue.values()) > self.queue_threshold:
-                # Only switch if current phase has been active for at least minimum duration
-                if time_in_phase >= self.min_green_duration:
-                    self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
-                    return
-
-        # Check if current phase should end normally
-        if time_in_phase >= self.green_duration:
-            self.set_phase((self.current_phase + 1) % len(self.phases), current_time)
-
-    def generate_report(self):
-        plt.figure(figsize=(15, 10))
-
-        # Plot queues for each lane
-        for i, (name, lane) in enumerate(self.lanes.items()):
-            df = pd.DataFrame(lane.history)
-
-            plt.subplot(2, 2, i+1)
-            plt.plot(df['time'], df['queue'], 'b-', label='Queue')
-            plt.plot(df['time'], df['arrivals'], 'g--', label='Arrivals', alpha=0.5)
-            plt.plot(df['time'], df['departures'], 'r:', label='Departures', alpha=0.5)
-
-            # Add light state background colors
-            prev_time = 0
-            prev_state = None
-            for _, row in df.iterrows():
-                if row['state'] != prev_state:
-                    if prev_state is not None:
-                        color = {'GREEN': 'lightgreen', 'YELLOW': 'yellow', 'RED': 'lightcoral'}[prev_state]
-                        plt.axvspan(prev_time, row['time'], facecolor=color, alpha=0.3)
-                    prev_state = row['state']
-                    prev_time = row['time']
-
-            if prev_state is not None:
-                color = {'GREEN': 'lightgreen', 'YELLOW': 'yellow', 'RED': 'lightcoral'}[prev_state]
-                plt.axvspan(prev_time, df['time'].max(), facecolor=color, alpha=0.3)
-
-            plt.title(f"{name.capitalize()} Lane Traffic")
-            plt.xlabel('Time (sec)')
-            plt.ylabel('Vehicles')
-            plt.legend()
-            plt.grid(True)
-
-        plt.tight_layout()
-        plt.savefig("4way_intersection_simulation.png")
-        print("\nReport generated: 4way_intersection_simulation.png")
-
-# [Rest of the TrafficLightSimulatorUI class remains the same]
+from intersection import LightState, IntersectionController, STATE_COLORS
+from telemetry import TimestepWriter, FirestoreSink
 
 class TrafficLightSimulatorUI:
     def __init__(self, root):
@@ -385,6 +30,10 @@ class TrafficLightSimulatorUI:
         self.sim_duration = 900  # 15 min = 900 sec
         self.time_step = 6  # 0.1 min = 6 sec
         self.plot_update_interval = 5  # Update plots every 5 steps
+        self.plot_window = None  # Rolling plot window in seconds, None shows the whole run
+        self.plot_state = {}
+        self.plot_background = None
+        self.telemetry = None  # Buffers timesteps for Firestore while a session is running
         self.step_count = 0
 
         # Create controller
@@ -504,6 +153,11 @@ class TrafficLightSimulatorUI:
 
         self.speed_scale.bind("<Motion>", self.update_speed_label)
 
+        ttk.Label(speed_frame, text="Plot Window (min, 0 = all):").pack(side=tk.LEFT, padx=10)
+        self.plot_window_entry = ttk.Entry(speed_frame, width=8)
+        self.plot_window_entry.insert(0, "0")
+        self.plot_window_entry.pack(side=tk.LEFT)
+
         # Status frame
         status_frame = ttk.LabelFrame(self.root, text="Simulation Status", padding=10)
         status_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -551,6 +205,8 @@ class TrafficLightSimulatorUI:
         self.fig, self.axs = plt.subplots(2, 2, figsize=(10, 8))
         self.canvas = FigureCanvasTkAgg(self.fig, master=vis_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # Any full redraw (including window resizes) refreshes the blitting background
+        self.canvas.mpl_connect('draw_event', self.on_plot_draw)
 
         # Initialize plots
         self.initialize_plots()
@@ -759,46 +415,121 @@ class TrafficLightSimulatorUI:
             self.file_entries[lane].insert(0, filename)
 
     def initialize_plots(self):
-        for ax in self.axs.flat:
+        # Lines and the still-open state band are animated: they are blitted over a cached
+        # background holding the axes, grid and finished state bands
+        self.plot_state = {}
+        for i, name in enumerate(self.controller.lanes):
+            ax = self.axs[i//2, i%2]
             ax.clear()
-            ax.set_title('')
-            ax.set_xlabel('Time (min)')
+            ax.set_title(f"{name.capitalize()} Lane Traffic")
+            ax.set_xlabel('Time (sec)')
             ax.set_ylabel('Vehicles')
             ax.grid(True)
+            ax.set_xlim(0, self.plot_window or self.sim_duration)
+            ax.set_ylim(0, 10)
+
+            lines = {
+                'queue': ax.plot([], [], 'b-', label='Queue', animated=True)[0],
+                'arrivals': ax.plot([], [], 'g--', label='Arrivals', alpha=0.5, animated=True)[0],
+                'departures': ax.plot([], [], 'r:', label='Departures', alpha=0.5, animated=True)[0],
+            }
+            ax.legend(loc='upper left')
+            self.plot_state[name] = {
+                'ax': ax,
+                'lines': lines,
+                'bands': [],  # (end time, artist) of finished state bands
+                'open_band': None,
+                'band_start': None,
+                'band_state': None,
+                'scanned': 0,  # History rows already checked for state changes
+                'y_max': 0,
+            }
         self.canvas.draw()
 
-    def update_plots(self):
-        for i, (name, lane) in enumerate(self.controller.lanes.items()):
-            ax = self.axs[i//2, i%2]
-            ax.clear()
+    def on_plot_draw(self, event=None):
+        self.plot_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_animated_artists()
 
-            if lane.history:
-                df = pd.DataFrame(lane.history)
-                ax.plot(df['time'], df['queue'], 'b-', label='Queue')
-                ax.plot(df['time'], df['arrivals'], 'g--', label='Arrivals', alpha=0.5)
-                ax.plot(df['time'], df['departures'], 'r:', label='Departures', alpha=0.5)
-
-                # Add light state background colors
-                prev_time = 0
-                prev_state = None
-                for _, row in df.iterrows():
-                    if row['state'] != prev_state:
-                        if prev_state is not None:
-                            color = {'GREEN': 'lightgreen', 'YELLOW': 'yellow', 'RED': 'lightcoral'}[prev_state]
-                            ax.axvspan(prev_time, row['time'], facecolor=color, alpha=0.3)
-                        prev_state = row['state']
-                        prev_time = row['time']
-
-                if prev_state is not None:
-                    color = {'GREEN': 'lightgreen', 'YELLOW': 'yellow', 'RED': 'lightcoral'}[prev_state]
-                    ax.axvspan(prev_time, df['time'].max(), facecolor=color, alpha=0.3)
+    def draw_animated_artists(self):
+        for state in self.plot_state.values():
+            for line in state['lines'].values():
+                state['ax'].draw_artist(line)
+            if state['open_band'] is not None:
+                state['ax'].draw_artist(state['open_band'])
 
-            ax.set_title(f"{name.capitalize()} Lane Traffic")
-            ax.set_xlabel('Time (sec)')  # Changed from 'Time (min)'
-            ax.legend()
-            ax.grid(True)
+    def update_plots(self):
+        full_redraw = False
+        new_bands = []
+        for name, lane in self.controller.lanes.items():
+            history = lane.history
+            if not history:
+                continue
+            state = self.plot_state[name]
+            ax = state['ax']
+            times = history['time']
+            now = times[-1]
+
+            # Finish a band for every light change since the last update
+            new_states = history['state'][state['scanned']:]
+            if state['band_state'] is None:
+                state['band_start'], state['band_state'] = times[0], new_states[0]
+            for i in np.flatnonzero(new_states != np.concatenate(([state['band_state']], new_states[:-1]))):
+                change_time = times[state['scanned'] + i]
+                band = ax.axvspan(state['band_start'], change_time,
+                                  facecolor=STATE_COLORS[LightState(state['band_state']).name], alpha=0.3)
+                state['bands'].append((change_time, band))
+                new_bands.append((ax, band))
+                state['band_start'], state['band_state'] = change_time, new_states[i]
+            state['scanned'] = len(history)
+
+            # The open band grows every update, so it is redrawn like the lines
+            if state['open_band'] is not None:
+                state['open_band'].remove()
+            state['open_band'] = ax.axvspan(
+                state['band_start'], now,
+                facecolor=STATE_COLORS[LightState(state['band_state']).name], alpha=0.3, animated=True,
+            )
 
-        self.canvas.draw()
+            first = 0
+            if self.plot_window:
+                # Scroll in jumps of a quarter window so the updates in between can blit
+                window_start, window_end = ax.get_xlim()
+                if now > window_end:
+                    window_end = now + self.plot_window / 4
+                    window_start = window_end - self.plot_window
+                    ax.set_xlim(window_start, window_end)
+                    full_redraw = True
+                    # Drop finished bands that have scrolled out of view
+                    while state['bands'] and state['bands'][0][0] < window_start:
+                        state['bands'].pop(0)[1].remove()
+                first = np.searchsorted(times, window_start)
+
+            for column, line in state['lines'].items():
+                line.set_data(times[first:], history[column][first:])
+
+            # Grow the y axis in jumps, so most updates keep the cached background
+            visible_max = max(history[column][first:].max() for column in state['lines'])
+            if visible_max > state['y_max']:
+                state['y_max'] = visible_max
+                top = max(10, int(visible_max * 1.25) + 1)
+                if top != ax.get_ylim()[1]:
+                    ax.set_ylim(0, top)
+                    full_redraw = True
+
+        if full_redraw or self.plot_background is None:
+            self.canvas.draw()  # Redraws the background, then on_plot_draw blits the rest
+            return
+
+        self.canvas.restore_region(self.plot_background)
+        if new_bands:
+            # Paint finished bands straight onto the cached background (legend back on top)
+            for ax, band in new_bands:
+                ax.draw_artist(band)
+            for ax in {ax for ax, _ in new_bands}:
+                ax.draw_artist(ax.get_legend())
+            self.plot_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_animated_artists()
+        self.canvas.blit(self.fig.bbox)
 
     def update_ui(self):
         # Update time and phase labels - show both seconds and minutes
@@ -845,7 +576,11 @@ class TrafficLightSimulatorUI:
             for lane in ['north', 'south', 'east', 'west']:
                 file_path = self.file_entries[lane].get()
                 if file_path:
-                    self.controller.lanes[lane].load_data(file_path)
+                    try:
+                        self.controller.lanes[lane].load_data(file_path)
+                    except Exception as e:
+                        messagebox.showerror("Error", str(e))
+                        return False
                 else:
                     messagebox.showwarning("Warning", f"No file selected for {lane} lane. Using empty data.")
 
@@ -856,6 +591,7 @@ class TrafficLightSimulatorUI:
             self.controller.phase_transition_buffer = float(self.transition_buffer_entry.get()) * 60
             self.controller.passing_rate = float(self.passing_rate_entry.get()) / 60  # convert veh/min to veh/sec
             self.sim_duration = float(self.duration_entry.get()) * 60  # convert min to sec
+            self.plot_window = float(self.plot_window_entry.get()) * 60 or None  # 0 shows the whole run
 
             return True
         except ValueError as e:
@@ -882,7 +618,7 @@ class TrafficLightSimulatorUI:
                         },
                         'start_time': datetime.now(timezone.utc).isoformat(),
                         'status': 'running',
-                        'timesteps': []
+                        'timestep_chunks': 0  # Timesteps go to the 'timesteps' subcollection
                     }
 
                     doc_ref = self.sessions_collection.document(session_id)
@@ -894,8 +630,10 @@ class TrafficLightSimulatorUI:
                 self.sim_time = 0
                 self.step_count = 0
 
-                # Reset controller
-                self.controller = IntersectionController()
+                # Reset controller; timesteps are batched to Firestore off the UI thread
+                if self.db and self.session_ref:
+                    self.telemetry = TimestepWriter(FirestoreSink(self.db, self.session_ref))
+                self.controller = IntersectionController(telemetry=self.telemetry)
                 self.load_simulation_parameters()
 
                 # Set initial phase
@@ -928,10 +666,16 @@ class TrafficLightSimulatorUI:
         self.sim_running = False
         self.sim_paused = False
 
+        # Write out buffered timesteps before marking the session complete
+        if self.telemetry:
+            self.telemetry.close()
+            self.telemetry = None
+            self.controller.telemetry = None
+
         # Update simulation status in Firestore
-        if hasattr(self, 'simulation_ref') and self.simulation_ref:
+        if getattr(self, 'session_ref', None):
             try:
-                self.simulation_ref.update({
+                self.session_ref.update({
                     'end_time': firestore.SERVER_TIMESTAMP,
                     'status': 'completed',
                     'total_vehicles': {
@@ -961,12 +705,8 @@ class TrafficLightSimulatorUI:
             return
 
         if self.sim_time <= self.sim_duration:
-            # Run simulation step with Firestore references
-            self.controller.update_intersection(
-                self.sim_time,
-                self.db,
-                self.session_ref if hasattr(self, 'session_ref') else None
-            )
+            # Run simulation step (the controller hands timesteps to its telemetry writer)
+            self.controller.update_intersection(self.sim_time)
             self.controller.check_phase_change(self.sim_time)
 
             # Update UI
@@ -0,0 +1,168 @@
+"""Buffered telemetry for simulation timesteps.
+
+The controller hands each timestep to a TimestepWriter, which only appends it to a buffer.
+A background thread flushes the buffer to a sink in chunks when it reaches `chunk_size`
+timesteps or `flush_interval` seconds have passed, so simulation speed never waits on the
+network. Sinks:
+
+- FirestoreSink: one document per chunk in the session's `timesteps` subcollection,
+  written together with the session fields (and `latest_timestep`) in a single batched write
+- JsonlSink: one JSON line per chunk, for headless runs
+- MemorySink: keeps everything in lists, for tests
+"""
+import json
+import threading
+import time
+
+
+class TimestepWriter:
+    def __init__(self, sink, chunk_size=50, flush_interval=5.0, max_pending=200):
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending  # Rejected chunks kept for retry while the sink is failing
+        self.buffer = []
+        self.session_fields = {}
+        self.failed = []  # Chunks the sink rejected, retried first on the next flush
+        self.next_index = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # One flush at a time, so chunks reach the sink in order
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="timestep-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, timestep):
+        with self.lock:
+            self.buffer.append(timestep)
+            full = len(self.buffer) >= self.chunk_size
+        if full:
+            self.wake.set()
+
+    def update_session(self, fields):
+        """Queue fields for the session document; later values for a field replace earlier ones"""
+        with self.lock:
+            self.session_fields.update(fields)
+
+    def flush(self, full_chunks_only=False):
+        """Write buffered timesteps and session fields; the size-triggered flush leaves a partial
+        trailing chunk buffered so chunks stay `chunk_size` long"""
+        with self.flush_lock:
+            with self.lock:
+                keep = len(self.buffer) % self.chunk_size if full_chunks_only else 0
+                buffer, self.buffer = self.buffer[:len(self.buffer) - keep], self.buffer[len(self.buffer) - keep:]
+                session_fields, self.session_fields = self.session_fields, {}
+            chunks, self.failed = self.failed, []
+            for start in range(0, len(buffer), self.chunk_size):
+                chunks.append((self.next_index, buffer[start:start + self.chunk_size]))
+                self.next_index += 1
+
+            if not chunks and not session_fields:
+                return True
+            if chunks:
+                session_fields = {**session_fields, 'timestep_chunks': chunks[-1][0] + 1}
+            try:
+                self.sink.write(chunks, session_fields)
+            except Exception as e:
+                print(f"Error writing telemetry: {e}")
+                # Only chunks the sink has rejected count against max_pending
+                dropped = len(chunks) - self.max_pending
+                if dropped > 0:
+                    print(f"⚠️ Telemetry sink is failing, dropped {dropped} timestep chunks")
+                    del chunks[:dropped]
+                self.failed = chunks
+                with self.lock:
+                    # Keep fields queued meanwhile as the newer values
+                    self.session_fields = {**session_fields, **self.session_fields}
+                return False
+            return True
+
+    def close(self, timeout=10.0):
+        """Flush everything still buffered and stop the background thread"""
+        self.stop_event.set()
+        self.wake.set()
+        self.thread.join(timeout)
+        self.flush()
+        self.sink.close()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self.stop_event.is_set():
+            self.wake.wait(max(0.0, self.flush_interval - (time.monotonic() - last_flush)))
+            self.wake.clear()
+            if self.stop_event.is_set():
+                break
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+            elif len(self.buffer) >= self.chunk_size:
+                self.flush(full_chunks_only=True)
+
+
+class FirestoreSink:
+    """Chunk documents in `<session>/timesteps`, committed with the session update in one batch"""
+
+    MAX_BATCH_WRITES = 500  # Firestore's limit per batched write
+
+    def __init__(self, db, session_ref, collection='timesteps'):
+        self.db = db
+        self.session_ref = session_ref
+        self.collection = session_ref.collection(collection)
+
+    def write(self, chunks, session_fields):
+        if chunks:
+            # The dashboard's live view polls the session document, so it carries the newest timestep
+            session_fields = {**session_fields, 'latest_timestep': chunks[-1][1][-1]}
+        # Leave room for the session update in the last batch
+        step = self.MAX_BATCH_WRITES - 1
+        for start in range(0, max(len(chunks), 1), step):
+            batch = self.db.batch()
+            for index, timesteps in chunks[start:start + step]:
+                batch.set(self.collection.document(f"{index:06d}"), {
+                    'index': index,
+                    'start_time': timesteps[0]['time'],
+                    'end_time': timesteps[-1]['time'],
+                    'count': len(timesteps),
+                    'timesteps': timesteps,
+                })
+            if session_fields and start + step >= len(chunks):
+                batch.update(self.session_ref, session_fields)
+            batch.commit()
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """Appends {"chunk": i, "timesteps": [...]} and {"session": {...}} lines to a file"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def write(self, chunks, session_fields):
+        # Serialize everything first so a failed write leaves no partial lines behind for the retry
+        lines = [json.dumps({'chunk': index, 'timesteps': timesteps}) + "\n" for index, timesteps in chunks]
+        if session_fields:
+            lines.append(json.dumps({'session': session_fields}) + "\n")
+        self.file.writelines(lines)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class MemorySink:
+    def __init__(self):
+        self.chunks = []
+        self.session = {}
+
+    def write(self, chunks, session_fields):
+        self.chunks.extend(chunks)
+        self.session.update(session_fields)
+
+    @property
+    def timesteps(self):
+        return [timestep for _, chunk in self.chunks for timestep in chunk]
+
+    def close(self):
+        pass